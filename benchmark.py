@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+##########################################################################################
+# OCI-SuperList offline benchmark                                                        #
+#                                                                                        #
+# Runs list.py against a fake OCI service layer (ocimodules/FakeOCI.py) for synthetic   #
+# tenancies of growing size, without network or credentials.                            #
+##########################################################################################
+# Usage
+#
+#   python3 benchmark.py [--sizes 10,100,1000] [--width 5] [--resources 2] [--latency 0.01]
+#                        [--throttle-rate 0.01] [--parse] [--outfile benchmark.csv]
+#                        [-- list.py options, e.g. -o compute -w 16 --rate 1000]
+#
+# Every size runs in its own process, so wall time and peak memory are measured per run.
+##########################################################################################
+
+import argparse
+import csv
+import json
+import os
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+
+Columns = ['compartments', 'seconds', 'api_calls', 'throttles', 'records', 'peak_rss_mb', 'parse_seconds']
+
+
+##########################################################################
+# RunChild
+# One benchmark run, in the child process. Prints the result as JSON
+##########################################################################
+def RunChild(args):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from ocimodules import FakeOCI
+    from ocimodules.functions import PeakMemoryMB
+
+    tenancy = FakeOCI.FakeTenancy(args.size, args.width, args.resources, args.page_size, args.latency, args.throttle_rate, args.retry_after,
+                                  unavailable=[u for u in args.unavailable.split(",") if u])
+    FakeOCI.Install(tenancy)
+
+    workdir = tempfile.mkdtemp(prefix="superlist-bench-")
+    logfile = os.path.join(workdir, "log.txt")
+    sys.argv = ["list.py", "-c", FakeOCI.TenancyId, "-f", "-log", logfile] + args.listargs
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    start = time.perf_counter()
+    try:
+        runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "list.py"), run_name="__main__")
+    except SystemExit:
+        pass
+    seconds = time.perf_counter() - start
+    sys.stdout = stdout
+
+    with open(logfile + ".csv", encoding="utf-8") as csvfile:
+        records = sum(1 for line in csvfile) - 1
+
+    parse_seconds = None
+    if args.parse:
+        from ocimodules.parse import parse_text_to_csv
+        start = time.perf_counter()
+        parse_text_to_csv(logfile, os.path.join(workdir, "parsed.csv"), False)
+        parse_seconds = time.perf_counter() - start
+
+    result = {'compartments': args.size, 'seconds': round(seconds, 3), 'api_calls': tenancy.total_calls(), 'throttles': tenancy.throttles,
+              'records': records, 'peak_rss_mb': round(PeakMemoryMB() or 0, 1), 'parse_seconds': round(parse_seconds, 3) if parse_seconds is not None else None}
+    print(json.dumps(result))
+
+
+##########################################################################
+# Main Program
+##########################################################################
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of OCI-SuperList against a fake OCI service layer")
+    parser.add_argument('--sizes', default="10,100,1000", help='Comma separated compartment counts. Default is 10,100,1000')
+    parser.add_argument('--width', type=int, default=5, help='Subcompartments per compartment. Default is 5')
+    parser.add_argument('--resources', type=int, default=2, help='Resources per service per compartment. Default is 2')
+    parser.add_argument('--page-size', type=int, default=100, dest='page_size', help='Items per page of the fake list calls. Default is 100')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds per fake API call. Default is 0')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, dest='throttle_rate', help='Fraction of API calls answered with 429. Default is 0')
+    parser.add_argument('--retry-after', type=float, default=1.0, dest='retry_after', help='Retry-After seconds of the injected 429s. Default is 1')
+    parser.add_argument('--unavailable', default="", help='Comma separated ServiceClients (e.g. ocvp.SddcClient) without an endpoint in the fake regions')
+    parser.add_argument('--parse', action='store_true', default=False, help='Also time log2csv parsing of the log file')
+    parser.add_argument('--outfile', default="", help='Write the results to this csv file')
+    parser.add_argument('--size', type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument('listargs', nargs=argparse.REMAINDER, help='Options passed to list.py, after --')
+    args = parser.parse_args()
+    if args.listargs and args.listargs[0] == "--":
+        args.listargs = args.listargs[1:]
+
+    if args.size:
+        RunChild(args)
+        return
+
+    print("  ".join(c.rjust(13) for c in Columns))
+    results = []
+    for size in [int(s) for s in args.sizes.split(",")]:
+        childargs = [sys.executable, os.path.abspath(__file__), "--size", str(size)]
+        childargs += ["--width", str(args.width), "--resources", str(args.resources), "--page-size", str(args.page_size), "--latency", str(args.latency),
+                      "--throttle-rate", str(args.throttle_rate), "--retry-after", str(args.retry_after), "--unavailable", args.unavailable]
+        if args.parse:
+            childargs.append("--parse")
+        childargs += ["--"] + args.listargs
+        output = subprocess.run(childargs, stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print("  ".join(str(result[c]).rjust(13) for c in Columns))
+
+    if args.outfile:
+        with open(args.outfile, "w", newline="") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=Columns)
+            writer.writeheader()
+            writer.writerows(results)
+        print("Results written to " + args.outfile)
+
+
+if __name__ == "__main__":
+    main()
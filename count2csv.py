@@ -1,64 +1,58 @@
 # about:
 # 1) gets count of budgets, budget alert rules, budget queries/schedules, and quotas
+#    in the compartment and all of its subcompartments
 # 2) prints to console
-# 3) outputs to simple csv 
+# 3) outputs to simple csv
 # usage:
 # python3 count2csv.py --t ocid1.tenancy.oc1..abcd1234
 # python3 count2csv.py --c ocid1.compartment.oc1..abcd1234
-# known issues:
-# most stable if run in home region, with root/tenancy as target. need to make it cleanly handle
+# python3 count2csv.py -cp PROFILE --workers 16
+# notes:
+# budgets, usage and quotas are home region services, the counts are always read in the home region.
+# the compartment tree is listed once, the counts of all compartments are read concurrently (--workers)
 
 import argparse
 import os
-import subprocess
-import json
 import csv
 import sys
-
-def run_oci_command(cmd):
+import oci
+from concurrent.futures import ThreadPoolExecutor
+from ocimodules.functions import create_signer
+from ocimodules.IAM import Login, GetHomeRegion, ProcessCompartments
+from ocimodules.Clients import GetClient
+from ocimodules.Executor import DefaultWorkers
+from ocimodules.RateLimit import RateController, SetController, Limited, GetRetryStrategy
+
+def list_all(client, operation, **kwargs):
     try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, check=True)
-        return json.loads(result.stdout)
-    except subprocess.CalledProcessError:
-        return None
-
-def count_budgets(compartment_id):
-    data = run_oci_command(f"oci budgets budget list --compartment-id {compartment_id}")
-    budgets = data.get("data", []) if data else []
+        return oci.pagination.list_call_get_all_results(Limited(client, operation), retry_strategy=GetRetryStrategy(), **kwargs).data
+    except oci.exceptions.ServiceError as e:
+        print("error {}-{} trying to {} {}".format(e.code, e.message, operation.__name__, kwargs.get("compartment_id") or kwargs.get("budget_id")))
+        return []
+
+def count_budgets(budget, compartment_id):
+    budgets = list_all(budget, budget.list_budgets, compartment_id=compartment_id)
     return len(budgets), budgets
 
-def count_budget_alerts(budgets):
-    total_alerts = 0
-    for b in budgets:
-        budget_id = b.get("id")
-        if not budget_id:
-            continue
-        data = run_oci_command(f"oci budgets budget alert-rule list --budget-id {budget_id}")
-        alerts = data.get("data", []) if data else []
-        total_alerts += len(alerts)
-    return total_alerts
-
-def count_usage_configurations(tenancy_id):
-    data = run_oci_command(f"oci usage-api configuration request-summarized --tenant-id {tenancy_id}")
-    configs = data.get("data", []) if data else []
-    if isinstance(configs, dict):
-        configs = [configs]
-    return len(configs)
-
-def count_usage_queries(compartment_id):
-    data = run_oci_command(f"oci usage-api query list --compartment-id {compartment_id}")
-    queries = data.get("data", []) if data else []
-    return len(queries)
-
-def count_usage_schedules(compartment_id):
-    data = run_oci_command(f"oci usage-api schedule list --compartment-id {compartment_id}")
-    schedules = data.get("data", []) if data else []
-    return len(schedules)
-
-def count_quotas(compartment_id):
-    data = run_oci_command(f"oci limits quota list --compartment-id {compartment_id}")
-    quotas = data.get("data", []) if data else []
-    return len(quotas)
+def count_budget_alerts(budget, budget_id):
+    return len(list_all(budget, budget.list_alert_rules, budget_id=budget_id))
+
+def count_usage_configurations(usage, tenancy_id):
+    try:
+        configs = Limited(usage, usage.request_summarized_configurations)(tenant_id=tenancy_id, retry_strategy=GetRetryStrategy()).data
+    except oci.exceptions.ServiceError as e:
+        print("error {}-{} trying to request_summarized_configurations".format(e.code, e.message))
+        return 0
+    return len(configs.items or [])
+
+def count_usage_queries(usage, compartment_id):
+    return len(list_all(usage, usage.list_queries, compartment_id=compartment_id))
+
+def count_usage_schedules(usage, compartment_id):
+    return len(list_all(usage, usage.list_schedules, compartment_id=compartment_id))
+
+def count_quotas(quotas, compartment_id):
+    return len(list_all(quotas, quotas.list_quotas, compartment_id=compartment_id))
 
 def print_table(counts):
     # Find column widths
@@ -74,39 +68,61 @@ def print_table(counts):
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--c", "--compartment-id", dest="compartment_id", help="Compartment OCID", required=False)
+    parser.add_argument("--c", "--compartment-id", dest="compartment_id", help="Compartment OCID, counted with all of its subcompartments", required=False)
     parser.add_argument("--t", "--tenancy-id", dest="tenancy_id", help="Tenancy OCID", required=False)
     parser.add_argument("--outfile", default="resource_counts.csv", help="CSV filename")
+    parser.add_argument("-cp", default="DEFAULT", dest="config_profile", help="Config Profile inside the config file")
+    parser.add_argument("-ip", action="store_true", default=False, dest="is_instance_principals", help="Use Instance Principals for Authentication")
+    parser.add_argument("-dt", action="store_true", default=False, dest="is_delegation_token", help="Use Delegation Token for Authentication")
+    parser.add_argument("--workers", type=int, default=DefaultWorkers, help="Number of concurrent API calls. Default is {}".format(DefaultWorkers))
     args = parser.parse_args()
 
-    compartment_id = (
-        args.compartment_id
-        or os.environ.get("COMPARTMENT_ID")
-        or args.tenancy_id
-        or os.environ.get("TENANCY_ID")
-    )
+    config, signer = create_signer(args.config_profile, args.is_instance_principals, args.is_delegation_token)
     tenancy_id = (
         args.tenancy_id
         or os.environ.get("TENANCY_ID")
-        or args.compartment_id
+        or config.get("tenancy")
+    )
+    compartment_id = (
+        args.compartment_id
         or os.environ.get("COMPARTMENT_ID")
+        or tenancy_id
     )
 
     if not compartment_id:
         print("Error: You must provide either a tenancy-id or a compartment-id (via --t or --c, or environment variables).", file=sys.stderr)
         sys.exit(1)
 
+    # Throttled calls slow down their endpoint instead of failing
+    SetController(RateController())
+    config["region"] = GetHomeRegion(config, signer)
+    compartments = ProcessCompartments(Login(config, signer, compartment_id, args.workers), tenancy_id)[0]
+    compartment_ids = [c.details.id for c in compartments]
+    print("Counting in {} compartments".format(len(compartment_ids)))
+
+    budget = GetClient("budget.BudgetClient", config, signer)
+    usage = GetClient("usage_api.UsageapiClient", config, signer)
+    quotas = GetClient("limits.QuotasClient", config, signer)
+
     counts = {}
-    # Budgets and Budget Alerts
-    budget_count, budgets = count_budgets(compartment_id)
-    counts["budgets"] = budget_count
-    counts["budget_alert_rules"] = count_budget_alerts(budgets) if budget_count > 0 else 0
-
-    # Usage configurations (normally just 1 per tenancy)
-    counts["usage_configurations"] = count_usage_configurations(tenancy_id)
-    counts["usage_queries"] = count_usage_queries(compartment_id)
-    counts["usage_schedules"] = count_usage_schedules(compartment_id)
-    counts["quotas"] = count_quotas(compartment_id)
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="count") as pool:
+        # All per compartment calls are queued at once, the alert rules once the budgets are known
+        budget_counts = pool.map(lambda cid: count_budgets(budget, cid), compartment_ids)
+        configurations = pool.submit(count_usage_configurations, usage, tenancy_id)
+        queries = pool.map(lambda cid: count_usage_queries(usage, cid), compartment_ids)
+        schedules = pool.map(lambda cid: count_usage_schedules(usage, cid), compartment_ids)
+        quota_counts = pool.map(lambda cid: count_quotas(quotas, cid), compartment_ids)
+
+        # Budgets and Budget Alerts
+        budgets = [b for count, compartment_budgets in budget_counts for b in compartment_budgets]
+        counts["budgets"] = len(budgets)
+        counts["budget_alert_rules"] = sum(pool.map(lambda b: count_budget_alerts(budget, b.id), budgets))
+
+        # Usage configurations (normally just 1 per tenancy)
+        counts["usage_configurations"] = configurations.result()
+        counts["usage_queries"] = sum(queries)
+        counts["usage_schedules"] = sum(schedules)
+        counts["quotas"] = sum(quota_counts)
 
     # Write CSV
     with open(args.outfile, "w", newline="") as csvfile:
@@ -17,40 +17,65 @@
 #   -o,  --objects           - Comma-separated list of components to list (e.g., Compute,Database,VbInstance). Default is all.
 #   --openscv                - Open csv file when program completes
 #   --top5                   - List only the top 5 most pertinent types of objects. Ok... more than 5. 
+#   -w,  --workers           - Number of concurrent list calls, 1 lists serially
+#   --endpoint-workers       - Max concurrent list calls per service endpoint
+#   --compartment-cache      - File caching the compartment trees between runs
+#   --compartment-ttl        - Hours a cached compartment tree is used, if unchanged
+#   --refresh-compartments   - Rebuild the cached compartment tree
+#   --subtree                - Load all compartments with one subtree query instead of walking the tree
+#   -q,  --quiet             - Write the output only to the log file, not to the terminal. Implies -f
+#   --no-log-records         - Write listed records only to the csv file, not to the log file
+#   --engine                 - list (list API per compartment) or search (Resource Search where available)
+#   --cost-days              - Cost column, cost of every object in the last N days (Usage API)
+#   --detail                 - Details column, 1 sizing, 2 and configuration, 3 all attributes
+#   --pool-size              - HTTP connections kept open per service client
+#   --rate                   - Max API calls per second per service endpoint (no limit by default), slowed down on throttling
+#   --resume                 - Resume an interrupted run, skipping the units already in the checkpoint journal
+#   --plan                   - Dry run, print the number of API calls per region and exit
+#   --profiles               - Batch mode, comma-separated config profiles of the tenancies to list concurrently
+#   --manifest               - Batch mode, json file with the runs (profile, compartment, regions, objects)
+#   --shard                  - List only shard i of N (i/N) of the work units and write a manifest for shard.py merge
+#   --no-probe               - Do not probe which services are available in each region before listing
+#   --probe-cache            - File caching the probe results between runs
+#   --probe-ttl              - Hours a cached probe result is used
+#   --format                 - Comma-separated output formats next to the csv file: jsonl, parquet, sqlite
+#   --prom-file              - Prometheus textfile for the run metrics, default <log file>.prom
 #
 ##########################################################################################
 # todo:                                                                                  #
 #    - add any missing services
 #    - add Category to CSV 
 #    - refactor to clean up code
-#    - add "if verbose" to list out detail items
 ##########################################################################################
 
 import sys
 import time
-import oci
 import platform
 import logging
 import os
 
+ImportStart = time.perf_counter()
+import oci
+
 # import ocimodules
-from ocimodules.functions import ( 
-    print_header, input_command_line, create_signer, check_oci_version, 
-    list_compute_components, list_vb_components, list_di_components,
-    list_db_components, list_mysql_components, list_nosql_components, 
-    list_oda_components, list_oac_components, list_integ_components, 
-    list_devops_components, list_ocvs_components, list_dbmigration_components, 
-    list_migration_components, list_gg_components, list_bastion_components,
-    list_waf_components, list_cloudguard_components, list_oke_components,
-    list_ocir_components, list_ds_components, list_apigw_components, 
-    list_datasafe_components, list_datacatalog_components, list_blockchain_components,
-    list_rm_components, list_dataflow_components, list_block_components, 
-    list_fss_components, list_network_components, list_observability_components, list_iam_components
-    # list_os_components, list_email_components, list_fn_components
-    # list_dbmanagement_components, list_loganalytics_components, list_anomaly_components
-)
-from ocimodules.IAM import Login, SubscribedRegions, GetHomeRegion, GetTenantName
-from ocimodules.parse import parse_text_to_csv
+from ocimodules.functions import print_header, input_command_line, create_signer, check_oci_version, CurrentTimeString, PeakMemoryMB
+from ocimodules.IAM import Login, SubscribedRegions, GetHomeRegion, GetTenantName, ProcessCompartments, SetCompartmentCache
+from ocimodules.Executor import WorkExecutor, SetExecutor
+from ocimodules.Search import SetEngine
+from ocimodules.Details import SetDetail
+from ocimodules.Cost import SetCostWindow, LoadCosts, PrintCosts
+from ocimodules import Clients
+from ocimodules.RateLimit import RateController, SetController, PrintStats
+from ocimodules import Records
+from ocimodules.Records import CsvSink, OpenSinks, CurrentSinks, ParquetAvailable, CloseSinks, ReplayRecords
+from ocimodules import Metrics
+from ocimodules.Checkpoint import CheckpointJournal, SetJournal, ParseShard, WriteManifest
+from ocimodules.Capabilities import SetProbe
+from ocimodules.Registry import CompilePlan, RunRegions, PrintPlan, UnknownCategories
+from ocimodules.Batch import ReadManifest, RunBatch
+from ocimodules.LogWriter import LogWriter
+ImportSeconds = time.perf_counter() - ImportStart
+StartupMemory = PeakMemoryMB()
 
 # Disable OCI CircuitBreaker feature
 oci.circuit_breaker.NoCircuitBreakerStrategy()
@@ -82,37 +107,18 @@ application_version = "24.12.01"
 debug = False
 
 
-#############################################
-# MyWriter to redirect output
-#############################################
-class MyWriter:
-
-    filename = "log.txt"
-
-    def __init__(self, stdout, filename):
-        self.stdout = stdout
-        self.filename = filename
-        self.logfile = open(self.filename, "a", encoding="utf-8")
-
-    def write(self, text):
-        self.stdout.write(text)
-        self.logfile.write(text)
-
-    def close(self):
-        self.stdout.close()
-        self.logfile.close()
-
-    def flush(self):
-        self.logfile.close()
-        self.logfile = open(self.filename, "a", encoding="utf-8")
-
-    def clear_buffer(self):
-        self.logfile.flush()  # Flush the log file buffer
-        os.fsync(self.logfile.fileno())
-
-
-def CurrentTimeString():
-    return time.strftime("%D %H:%M:%S", time.localtime())
+##########################################################################
+# WriteMetrics
+# Metrics of every API call, per (region, service, compartment)
+##########################################################################
+def WriteMetrics(logfile, prom_file, run):
+    print("Slowest services     :")
+    Metrics.PrintSummary()
+    metrics_file = logfile + ".metrics.json"
+    prom_file = prom_file if prom_file else logfile + ".prom"
+    Metrics.WriteJson(metrics_file, run)
+    Metrics.WritePrometheus(prom_file, run)
+    print("Metrics written to   : " + metrics_file + ", " + prom_file)
 
 
 ##########################################################################
@@ -123,15 +129,16 @@ check_oci_version(min_version_required)
 # Check command line
 cmd = input_command_line()
 
-# Redirect output to log.txt
+# Redirect output to log.txt, written by a background thread
 logfile = cmd.log_file
-writer = MyWriter(sys.stdout, logfile)
+writer = LogWriter(sys.stdout, logfile, cmd.quiet)
 sys.stdout = writer
 
 # configfile = cmd.config_file if cmd.config_file else configfile
 configProfile = cmd.config_profile if cmd.config_profile else configProfile
 debug = cmd.debug if cmd.debug else debug
-force = cmd.force
+# Quiet runs are unattended, there is no one to confirm
+force = cmd.force or cmd.quiet
 regions = cmd.regions.split(",") if cmd.regions else regions
 ListCompartmentOCID = cmd.compartment if cmd.compartment else ListCompartmentOCID
 objects = cmd.objects.split(",") if cmd.objects else ["all"]  # Enforce list
@@ -139,6 +146,76 @@ top5 = cmd.top5
 if top5:
     objects = ["Top 5"]
 opencsv = cmd.opencsv 
+workers = cmd.workers
+SetEngine(cmd.engine)
+SetDetail(cmd.detail, cmd.workers)
+SetCostWindow(cmd.cost_days)
+Clients.SetPoolSize(cmd.pool_size)
+SetProbe(not cmd.no_probe, cmd.probe_cache, cmd.probe_ttl)
+SetCompartmentCache(cmd.compartment_cache, cmd.compartment_ttl, cmd.refresh_compartments)
+
+formats = [f.strip().lower() for f in cmd.format.split(",") if f.strip()]
+unknown_formats = [f for f in formats if f not in ("csv", "jsonl", "parquet", "sqlite")]
+if unknown_formats:
+    print("Unknown formats: " + ', '.join(unknown_formats) + "\n")
+    sys.exit(2)
+if "parquet" in formats and not ParquetAvailable():
+    print("--format parquet needs pyarrow, install it with: pip install pyarrow\n")
+    sys.exit(2)
+
+# A shard lists a hash partition of the work units, merged afterwards with shard.py merge
+shard = (0, 1)
+if cmd.shard:
+    try:
+        shard = ParseShard(cmd.shard)
+    except ValueError:
+        print("--shard must be i/N with 0 <= i < N, e.g. --shard 0/4\n")
+        sys.exit(2)
+
+# Compile the selected services of the registry into the work plan
+if UnknownCategories(objects):
+    print("Unknown components: " + ', '.join(UnknownCategories(objects)) + "\n")
+plan = CompilePlan(objects, top5)
+
+######################################################
+# Batch mode, the tenancies of the profiles run concurrently
+# in this process, sharing the workers and the rate controller.
+# Every tenancy gets its own outputs, <log file>.<profile>.*
+######################################################
+if cmd.profiles or cmd.manifest:
+    try:
+        runs = ReadManifest(cmd.profiles, cmd.manifest)
+    except ValueError as e:
+        print("Invalid batch: " + str(e) + "\n")
+        sys.exit(2)
+    print_header("OCI-SuperList batch", 0)
+    print("Date/Time          : " + CurrentTimeString())
+    print("Command Line       : " + ' '.join(x for x in sys.argv[1:]))
+    for run in runs:
+        print("Run                : " + run["name"] + " (profile " + (run["profile"] or "DEFAULT") + ")")
+
+    # --plan prints the plan of every tenancy and lists nothing
+    if cmd.plan:
+        SetController(RateController(cmd.rate, cmd.endpoint_workers))
+        results = RunBatch(cmd, runs, logfile, regions, plan, formats, None, shard)
+        writer.close()
+        sys.exit(0 if len(results) == len(runs) else 1)
+
+    confirm = "yes" if force else input("\ntype yes to list these tenancies: ")
+    if confirm != "yes":
+        print("ok, doing nothing")
+        sys.exit(0)
+
+    SetController(RateController(cmd.rate, cmd.endpoint_workers))
+    executor = WorkExecutor(workers, cmd.endpoint_workers) if workers > 1 else None
+    results = RunBatch(cmd, runs, logfile, regions, plan, formats, executor, shard)
+    if executor:
+        executor.shutdown()
+    PrintStats()
+    PrintCosts()
+    WriteMetrics(logfile, cmd.prom_file, {"tenancies": len(results), "records": Records.RecordCount})
+    writer.close()
+    sys.exit(0 if len(results) == len(runs) else 1)
 
 if ListCompartmentOCID == "":
     print("No compartment specified \n")
@@ -151,6 +228,9 @@ if ListCompartmentOCID == "":
 config, signer = create_signer(cmd.config_profile, cmd.is_instance_principals, cmd.is_delegation_token)
 tenant_id = config['tenancy']
 
+# All API calls share one rate controller, adapting to throttling per service endpoint
+SetController(RateController(cmd.rate, cmd.endpoint_workers))
+
 if debug:
     config['log_requests'] = True
     logging.basicConfig()
@@ -163,14 +243,8 @@ if debug:
 # Add root compartment to processRootCompartment if specified for root compartment objects
 ######################################################
 print("\nLogin check and loading compartments...\n")
-compartments = Login(config, signer, ListCompartmentOCID)
-processCompartments = []
-processRootCompartment = []
-for compartment in compartments:
-    if compartment.details.lifecycle_state == "ACTIVE" and compartment.details.name != "ManagedCompartmentForPaaS":
-        processCompartments.append(compartment)
-    if compartment.details.id == tenant_id:
-        processRootCompartment.append(compartment)
+compartments = Login(config, signer, ListCompartmentOCID, workers, cmd.subtree)
+processCompartments, processRootCompartment = ProcessCompartments(compartments, tenant_id)
 
 # Check if regions specified if not getting all subscribed regions.
 if len(regions) == 0:
@@ -178,6 +252,7 @@ if len(regions) == 0:
 
 homeregion = GetHomeRegion(config, signer)
 tenant_name = GetTenantName(config, signer)
+config["tenancy_name"] = tenant_name
 
 ######################################################
 # Header Print and Confirmation
@@ -190,6 +265,7 @@ print("App Version        : " + application_version)
 print("Machine            : " + platform.node() + " (" + platform.machine() + ")")
 print("OCI SDK Version    : " + oci.version.__version__)
 print("Python Version     : " + platform.python_version())
+print("Startup            : imports {:.2f}s, ".format(ImportSeconds) + ("RSS after import {:.0f} MB".format(StartupMemory) if StartupMemory else "RSS n/a"))
 print("Config File        : " + configfile)
 print("Config Profile     : " + configProfile)
 print("Log File           : " + logfile)
@@ -199,11 +275,22 @@ print("Tenant Id          : " + config['tenancy'])
 print("Home Region        : " + homeregion)
 print("Regions to Process : " + ','.join(x for x in regions))
 print("Components to Process : " + ', '.join(objects))
+print("Engine             : " + cmd.engine)
+print("Detail level       : " + str(cmd.detail))
+if cmd.cost_days:
+    print("Cost window        : last " + str(cmd.cost_days) + " days")
+if shard[1] > 1:
+    print("Shard              : " + str(shard[0]) + "/" + str(shard[1]))
+print("Workers            : " + (str(workers) + " (" + str(cmd.endpoint_workers) + " per endpoint)" if workers > 1 else "serial"))
 print("\nCompartments to Process : \n")
 for c in processCompartments:
     print("  " + c.fullpath)
 
 
+if cmd.plan:
+    PrintPlan(config, signer, plan, regions, homeregion, processCompartments)
+    sys.exit(0)
+
 #########################################
 # Check confirmation for execution
 #########################################
@@ -215,162 +302,40 @@ else:
 if confirm == "yes":
 
     ######################################################
-    # Loop on Regions
+    # Records from ListAny are written to the csv file as they arrive, to the
+    # jsonl, parquet and sqlite files of --format and optionally as text blocks to the log file
     ######################################################
-    for region in regions:
-
-        print_header("Listing resources in region " + region, 0)
-        config["region"] = region
-
-        if "compute" in objects or "all" in objects or top5:
-            print_header("Listing Compute Instances at " + CurrentTimeString() + "@ " + region, 1)
-            list_compute_components(config, signer, processCompartments)
-
-        if "vbinstance" in objects or "all" in objects or top5:
-            print_header("Listing Visual Builder Components at " + CurrentTimeString() + "@ " + region, 1)
-            list_vb_components(config, signer, processCompartments)  # Call the function from functions.py
-
-        if "dataintegration" in objects or "all" in objects:
-            print_header("Listing Data Integratation services at " + CurrentTimeString() + "@ " + region, 1)
-            list_di_components(config, signer, processCompartments)
-
-        if "database" in objects or "all" in objects or top5:
-            print_header("Listing Oracle Databases at " + CurrentTimeString() + "@ " + region, 1)
-            list_db_components(config, signer, processCompartments) 
-
-        if "database" in objects or "all" in objects or top5:
-            print_header("Listing MySQL Database Instances at " + CurrentTimeString() + "@ " + region, 1)
-            list_mysql_components(config, signer, processCompartments)
-
-        if "database" in objects or "all" in objects or top5:
-            print_header("Listing Nosql tables at " + CurrentTimeString() + "@ " + region, 1)
-            list_nosql_components(config, signer, processCompartments)
-
-        if "oda" in objects or "all" in objects or top5:
-            print_header("Listing Digital Assistants at " + CurrentTimeString() + "@ " + region, 1)
-            list_oda_components(config, signer, processCompartments)
-
-        if "analytics" in objects or "all" in objects or top5:
-            print_header("Listing Analytics at " + CurrentTimeString() + "@ " + region, 1)
-            list_oac_components(config, signer, processCompartments)
-
-        if "integration" in objects or "all" in objects:
-            print_header("Listing Integration at " + CurrentTimeString() + "@ " + region, 1)
-            list_integ_components(config, signer, processCompartments)
+    csv_file = logfile + ".csv"
+    if cmd.cost_days:
+        print("Costs read for " + str(LoadCosts(config, signer, homeregion)) + " resources")
+    OpenSinks(logfile, formats, compartments, not cmd.no_log_records)
 
-        if "devops" in objects or "all" in objects:
-            print_header("Listing DevOps Projects at " + CurrentTimeString() + "@ " + region, 1)
-            list_devops_components(config, signer, processCompartments)
-
-        if "ocvs" in objects or "all" in objects or top5:
-            print_header("Listing Oracle Cloud VMware solution at " + CurrentTimeString() + "@ " + region, 1)
-            list_ocvs_components(config, signer, processCompartments)
-
-        if "dbmigration" in objects or "all" in objects:
-            print_header("Listing Database Migrations at " + CurrentTimeString() + "@ " + region, 1)
-            list_dbmigration_components(config, signer, processCompartments)
-
-        if "migration" in objects or "all" in objects:
-            print_header("Listing Migrations at " + CurrentTimeString() + "@ " + region, 1)
-            list_migration_components(config, signer, processCompartments)
-
-        if "goldengate" in objects or "all" in objects:
-            print_header("Listing GoldenGate at " + CurrentTimeString() + "@ " + region, 1)
-            list_gg_components(config, signer, processCompartments)
-
-        if "bastion" in objects or "all" in objects:
-            print_header("Listing Bastion Services at " + CurrentTimeString() + "@ " + region, 1)
-            list_bastion_components(config, signer, processCompartments)
-
-        if "waf" in objects or "all" in objects:
-            print_header("Listing Web Application Firewall at " + CurrentTimeString() + "@ " + region, 1)
-            list_waf_components(config, signer, processCompartments)
-
-        # if "objectstorage" in objects or "all" in objects:
-        #     print_header("Listing Object Storage at " + CurrentTimeString() + "@ " + region, 1)
-        #     list_os_components(config, signer, processCompartments)
-
-        if "cloudguard" in objects or "all" in objects:
-            print_header("Listing Cloud Guard Servcies at " + CurrentTimeString() + "@ " + region, 1)
-            list_cloudguard_components(config, signer, processCompartments)
-
-        # if "email" in objects or "all" in objects:
-        #     print_header("Listing Email Service at " + CurrentTimeString() + "@ " + region, 1)
-        #     list_email_components(config, signer, processCompartments)
-
-        if "oke" in objects or "all" in objects:
-            print_header("Listing OKE Clusters at " + CurrentTimeString() + "@ " + region, 1)
-            list_oke_components(config, signer, processCompartments)
-
-        if "ocir" in objects or "all" in objects:
-            print_header("Listing Repositories at " + CurrentTimeString() + "@ " + region, 1)
-            list_ocir_components(config, signer, processCompartments)
-
-        if "datascience" in objects or "all" in objects:
-            print_header("Listing DataScience Components at " + CurrentTimeString() + "@ " + region, 1)
-            list_ds_components(config, signer, processCompartments)
-
-        # if "functions" in objects or "all" in objects:
-        #     print_header("Listing Functions (Fn) at " + CurrentTimeString() + "@ " + region, 1)
-        #     list_fn_components(config, signer, processCompartments)
-
-        if "apigateway" in objects or "all" in objects:
-            print_header("Listing API Gateway Service at " + CurrentTimeString() + "@ " + region, 1)
-            list_apigw_components(config, signer, processCompartments)
-
-        if "datasafe" in objects or "all" in objects:
-            print_header("Listing Datasafe services at " + CurrentTimeString() + "@ " + region, 1)
-            list_datasafe_components(config, signer, processCompartments)
-
-        # if "dbmanagement" in objects or "all" in objects:
-        #     print_header("Listing Database Management services at " + CurrentTimeString() + "@ " + region, 1)
-        #     list_dbmanagement_components(config, signer, processCompartments)
-
-        # if "loganalytics" in objects or "all" in objects:
-        #     print_header("Listing Log Analytics services at " + CurrentTimeString() + "@ " + region, 1)1)
-        #     list_loganalytics_components(config, signer, processCompartments)
-
-        if "datacatalog" in objects or "all" in objects:
-            print_header("Listing Data Catalog services at " + CurrentTimeString() + "@ " + region, 1)
-            list_datacatalog_components(config, signer, processCompartments)
-
-        if "blockchain" in objects or "all" in objects:
-            print_header("Listing Blockchain at " + CurrentTimeString() + "@ " + region, 1)
-            list_blockchain_components(config, signer, processCompartments)
-
-        if "rm" in objects or "all" in objects:
-            print_header("Listing Resource Manager Stacks at " + CurrentTimeString() + "@ " + region, 1)
-            list_rm_components(config, signer, processCompartments)
-
-        # if "anomaly" in objects or "all" in objects:
-        #     print_header("Listing Anomaly Detection Services at " + CurrentTimeString() + "@ " + region, 1)
-        #     list_anomaly_components(config, signer, processCompartments)
-
-        if "dataflow" in objects or "all" in objects:
-            print_header("Listing Data Flow Services at " + CurrentTimeString() + "@ " + region, 1)
-            list_dataflow_components(config, signer, processCompartments)
-
-        if "block" in objects or "all" in objects or top5:
-            print_header("Listing Block Volumes at " + CurrentTimeString() + "@ " + region, 1)
-            list_block_components(config, signer, processCompartments)
-
-        if "fss" in objects or "all" in objects or top5:
-            print_header("Listing FileSystem and Mount Targets at " + CurrentTimeString() + "@ " + region, 1)
-            list_fss_components(config, signer, processCompartments)
-
-        if "network" in objects or "all" in objects:
-            print_header("Listing Network Components at " + CurrentTimeString() + "@ " + region, 1)
-            list_network_components(config, signer, processCompartments)
+    ######################################################
+    # Every completed unit is journaled, so an interrupted run can be resumed.
+    # On resume the csv is rebuilt from the journal and completed units are skipped
+    ######################################################
+    journal = CheckpointJournal(logfile + ".journal", cmd.resume, shard)
+    SetJournal(journal)
+    if cmd.resume:
+        print_header("Resuming, " + str(len(journal.completed)) + " units already completed", 2)
+        ReplayRecords(journal.records())
 
-        if "observability" in objects or "all" in objects:
-            print_header("Listing Database Migrations at " + CurrentTimeString() + "@ " + region, 1)
-            list_observability_components(config, signer, processCompartments)
+    ######################################################
+    # Work units of ListAny run on a bounded thread pool
+    ######################################################
+    executor = None
+    if workers > 1:
+        executor = WorkExecutor(workers, cmd.endpoint_workers)
+        SetExecutor(executor)
 
-        if "iam" in objects or "all" in objects:
-            if region == homeregion:
-                print_header("Listing IAM Components at " + CurrentTimeString() + "@ " + region, 1)
-                list_iam_components(config, signer, processCompartments)
+    ######################################################
+    # Loop on Regions
+    ######################################################
+    RunRegions(config, signer, plan, regions, homeregion, processCompartments, workers)
 
+    if executor:
+        executor.shutdown()
+        SetExecutor(None)
 
     print_header("SUCCESS! Listing complete at " + CurrentTimeString(), 0)
     print("Tenant Name          : " + tenant_name)
@@ -380,12 +345,21 @@ if confirm == "yes":
     print("Objects              : " + ', '.join(objects))
     for c in processCompartments:
         print("Compartment          : " + c.fullpath)
-    csv_file = logfile + ".csv" 
-    print_header("Waiting for log file to fully flush before writing csv...", 0) 
-    writer.flush() 
-    time.sleep(3)
-    print_header("Writing csv file...", 2)
-    parse_text_to_csv(logfile, csv_file, debug)
+    print("Clients built        : " + str(Clients.ClientsBuilt))
+    print("Connections opened   : " + str(Clients.ConnectionsOpened()))
+    PrintStats()
+    PrintCosts()
+    WriteMetrics(logfile, cmd.prom_file, {"compartments": len(processCompartments), "regions": len(regions), "records": Records.RecordCount})
+    records = sum(sink.rows for sink in CurrentSinks() if isinstance(sink, CsvSink))
+    CloseSinks()
+    journal.close()
+    if shard[1] > 1:
+        WriteManifest(logfile + ".manifest.json", journal, csv_file, records)
+        print("Shard manifest       : " + logfile + ".manifest.json")
+    SetJournal(None)
+    for f in formats:
+        if f != "csv":
+            print(f.upper() + " file is ready at: " + logfile + "." + f)
     print("CSV file is ready at: "+ csv_file + "\n")
     # Open the CSV file
     if opencsv:
@@ -399,3 +373,7 @@ if confirm == "yes":
                 os.system(f'xdg-open {csv_file}')
 else:
     print("ok, doing nothing")
+
+# Final flush, everything printed is in the log file
+writer.close()
+sys.stdout = writer.stdout
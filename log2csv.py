@@ -0,0 +1,32 @@
+# about:
+# 1) converts an existing OCI-SuperList log file to csv
+# 2) the log is streamed, large logs are split at record boundaries and parsed on several processes
+# usage:
+# python3 log2csv.py log.txt
+# python3 log2csv.py export-20250116.txt --outfile export.csv --workers 8
+
+import argparse
+import os
+import sys
+from ocimodules.parse import parse_text_to_csv
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("logfile", help="OCI-SuperList log file")
+    parser.add_argument("--outfile", default="", help="CSV filename, default is the log file name with .csv added")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="Number of parsing processes")
+    parser.add_argument("-d", "--debug", action="store_true", default=False, help="Print every parsed line")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.logfile):
+        print(f"Error: log file {args.logfile} not found.", file=sys.stderr)
+        sys.exit(1)
+
+    outfile = args.outfile if args.outfile else args.logfile + ".csv"
+    parse_text_to_csv(args.logfile, outfile, args.debug, args.workers)
+    print(f"CSV file is ready at: {outfile}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,207 @@
 import oci
 import time
+from ocimodules.Executor import GetExecutor
+from ocimodules.Checkpoint import GetJournal, UnitKey
+from ocimodules.Clients import GetClient
+from ocimodules.RateLimit import Limited, GetRetryStrategy
+from ocimodules.IAM import GetAvailabilityDomains
+from ocimodules.Records import BuildRecord, EmitRecord, SafePrint
+from ocimodules.Search import SearchSupported, SearchAny
+from ocimodules.Details import Enrich
 
 WaitRefresh = 15
 MaxIDeleteIteration = 20
 
+
+##########################################################################
+# ListCompartment
+# Lists one object type in one compartment, or one availability domain
+# of a compartment for PerAD objects (one work unit of ListAny)
+##########################################################################
+def ListCompartment(config, object, C, ServiceClient, ServiceName, ListCommand, ObjectNameVar="display_name", Extra="", AvailabilityDomain=None, GetCommand=""):
+    try:
+        Compartment = C.details
+        compartment_name = C.fullpath
+        journal = GetJournal()
+        unit = UnitKey(config["region"], ServiceClient, ServiceName, Compartment.id, AvailabilityDomain)
+        if journal and journal.done(unit):
+            return
+
+        items = []
+        try:
+            if AvailabilityDomain:
+                items = eval("oci.pagination.list_call_get_all_results(Limited(object, object.{}), availability_domain=\"{}\", compartment_id=Compartment.id{}, retry_strategy=GetRetryStrategy()).data".format(ListCommand, AvailabilityDomain, Extra))
+            else:
+                items = eval("oci.pagination.list_call_get_all_results(Limited(object, object.{}), compartment_id=Compartment.id{}, retry_strategy=GetRetryStrategy()).data".format(ListCommand, Extra))
+        except oci.exceptions.ServiceError as response:
+            if response.code == 404:
+                SafePrint("No items found in compartment {}   ".format(Compartment.name), end="\r")
+            else:
+                SafePrint("error {}-{} trying to list: {}".format(response.code, response.message, ServiceName))
+                # Not journaled, so the unit is listed again on resume, but reported as failed
+                # instead of missing in the shard manifest
+                if journal:
+                    journal.fail(unit, "{} {}".format(response.status, response.code))
+                journal = None
+
+        items = [item for item in items if item.lifecycle_state.lower() not in ("deleted", "terminated")]
+        records = [BuildRecord(config, item, ServiceName, compartment_name, ObjectNameVar) for item in items]
+        Enrich(object, ServiceClient, ServiceName, GetCommand, items, records)
+
+        # The unit is journaled before its records are written, a resume rebuilds the outputs from the journal
+        if journal:
+            journal.commit(unit, records)
+        for record in records:
+            EmitRecord(record)
+
+    except Exception as e:
+        SafePrint(f'\nError in ListAny, {ServiceClient}:{ServiceName}: {str(e)}')
+
+
+##########################################################################
+# ListSubtree
+# Lists one object type in all Compartments with a single paged call on
+# the start compartment (compartment_id_in_subtree) and buckets the items
+# to their compartment. Falls back to one unit per compartment if the
+# subtree call fails, e.g. when not authorized on the start compartment
+##########################################################################
+def ListSubtree(config, object, Compartments, ServiceClient, ServiceName, ListCommand, ObjectNameVar="display_name", Extra="", Subtree=True, GetCommand=""):
+    try:
+        start = min(Compartments, key=lambda C: C.level)
+        journal = GetJournal()
+        unit = UnitKey(config["region"], ServiceClient, ServiceName, start.details.id, "subtree")
+        if journal and (not journal.owns(unit) or journal.done(unit)):
+            return
+
+        # Subtree is True, or the access_level of the services that need one
+        subtree = {"compartment_id_in_subtree": True}
+        if Subtree is not True:
+            subtree["access_level"] = Subtree
+        try:
+            items = eval("oci.pagination.list_call_get_all_results(Limited(object, object.{}), compartment_id=start.details.id{}, retry_strategy=GetRetryStrategy(), **subtree).data".format(ListCommand, Extra))
+        except Exception as e:
+            SafePrint("Subtree listing of {} failed ({}), listing per compartment".format(ServiceName, getattr(e, "code", None) or str(e)[:80]))
+            # The per compartment units belong to the shard of the subtree unit
+            if journal:
+                journal.replace(unit, [UnitKey(config["region"], ServiceClient, ServiceName, C.details.id) for C in Compartments])
+            ListUnits(config, object, Compartments, ServiceClient, ServiceName, ListCommand, ObjectNameVar, Extra, [None], sharded=False, GetCommand=GetCommand)
+            return
+
+        # Items of compartments that are not listed (inactive, ManagedCompartmentForPaaS) are dropped
+        index = {C.details.id: C for C in Compartments}
+        buckets = {}
+        for item in items:
+            C = index.get(getattr(item, "compartment_id", None))
+            if C and (getattr(item, "lifecycle_state", None) or "").lower() not in ("deleted", "terminated"):
+                buckets.setdefault(C.details.id, []).append(item)
+
+        # Same order as per compartment listing
+        items = [item for C in Compartments for item in buckets.get(C.details.id, [])]
+        records = [BuildRecord(config, item, ServiceName, index[item.compartment_id].fullpath, ObjectNameVar) for item in items]
+        Enrich(object, ServiceClient, ServiceName, GetCommand, items, records)
+        if journal:
+            journal.commit(unit, records)
+        for record in records:
+            EmitRecord(record)
+
+    except Exception as e:
+        SafePrint(f'\nError in ListAny, {ServiceClient}:{ServiceName}: {str(e)}')
+
+
+##########################################################################
+# ListUnits / SubmitUnit
+# Runs one ListCompartment work unit per compartment (and AD) of this
+# shard, on the executor if there is one
+##########################################################################
+def ListUnits(config, object, Compartments, ServiceClient, ServiceName, ListCommand, ObjectNameVar, Extra, ads, sharded=True, GetCommand=""):
+    journal = GetJournal()
+    for C in Compartments:
+        for ad in ads:
+            # Units of other shards (--shard) are left to them
+            if sharded and journal and not journal.owns(UnitKey(config["region"], ServiceClient, ServiceName, C.details.id, ad)):
+                continue
+            SubmitUnit(config, ServiceClient, ListCompartment, config, object, C, ServiceClient, ServiceName, ListCommand, ObjectNameVar, Extra, ad, GetCommand)
+
+
+def SubmitUnit(config, ServiceClient, fn, *args):
+    executor = GetExecutor()
+    if executor:
+        executor.submit("{}@{}".format(ServiceClient, config["region"]), fn, *args)
+    else:
+        fn(*args)
+
+
+##########################################################################
+# ListCommandName
+# Name of the list operation of ServiceName
+##########################################################################
+def ListCommandName(ServiceName):
+    # If service name ends on 'y', make plural to 'ies', "ss" to "sses", else just add 's'
+    if ServiceName[-2:] == "ay":
+        return "list_" + ServiceName + "s"
+    elif ServiceName[-2:] == "ey":
+        return "list_" + ServiceName + "s"
+    elif ServiceName[-1] == "y":
+        return "list_" + ServiceName[0:-1] + "ies"
+    elif ServiceName[-2:] == "ss":
+        return "list_" + ServiceName + "es"
+    else:
+        return "list_" + ServiceName + "s"
+
+
 ##########################################################################
 # ListAny
 # Lists any OCI Object
 ##########################################################################
-def ListAny(config, signer, Compartments, ServiceClient, ServiceName, ServiceID="", ReturnServiceID="id", ListCommand="", GetCommand="", ObjectNameVar="display_name", Extra="", Filter="", PerAD=False):
+def ListAny(config, signer, Compartments, ServiceClient, ServiceName, ServiceID="", ReturnServiceID="id", ListCommand="", GetCommand="", ObjectNameVar="display_name", Extra="", Filter="", PerAD=False, Subtree=False):
+    # Objects indexed by Resource Search are taken from the search results of the region,
+    # they are listed per compartment if the search of the region failed
+    searchfailed = False
+    if SearchSupported(ServiceClient, ServiceName):
+        if SearchAny(config, signer, Compartments, ServiceClient, ServiceName, ObjectNameVar, GetCommand or "get_" + ServiceName):
+            return
+        searchfailed = True
+
     try:
         AllItems = []
-        object = eval("oci.{}(config, signer=signer)".format(ServiceClient))
+        object = GetClient(ServiceClient, config, signer)
         if not object:
             print(f'Object not defined for {ServiceName}')
 
         if ServiceID == "":
             ServiceID = ServiceName + "_id"
         if ListCommand == "":
-            # If service name ends on 'y', make plural to 'ies', "ss" to "sses", else just add 's'
-            if ServiceName[-2:] == "ay":
-                ListCommand = "list_" + ServiceName + "s"
-            elif ServiceName[-2:] == "ey":
-                ListCommand = "list_" + ServiceName + "s"
-            elif ServiceName[-1] == "y":
-                ListCommand = "list_" + ServiceName[0:-1] + "ies"
-            elif ServiceName[-2:] == "ss":
-                ListCommand = "list_" + ServiceName + "es"
-            else:
-                ListCommand = "list_" + ServiceName + "s"
+            ListCommand = ListCommandName(ServiceName)
         if GetCommand == "":
             GetCommand = "get_" + ServiceName
 
+        # Availability domains are the same for all compartments, one work unit per AD
+        ads = [None]
         if PerAD:
-            identity = oci.identity.IdentityClient(config, signer=signer)
+            ads = [ad.name for ad in GetAvailabilityDomains(config, signer)]
 
-        print("Getting all {} objects                 ".format(ServiceName), end="\r")
-        items = []
-        for C in Compartments:
-            Compartment = C.details
-            compartment_name = C.fullpath
-            try:
-                if PerAD:
-                    ads = identity.list_availability_domains(compartment_id=Compartment.id).data
-                    for ad in ads:
-                        itemstemp = eval("oci.pagination.list_call_get_all_results(object.{}, availability_domain=\"{}\", compartment_id=Compartment.id{}, retry_strategy=oci.retry.DEFAULT_RETRY_STRATEGY).data".format(ListCommand, ad.name, Extra))
-                        for item in itemstemp:
-                            items.append(item)
-                else:
-                    items = eval("oci.pagination.list_call_get_all_results(object.{}, compartment_id=Compartment.id{}, retry_strategy=oci.retry.DEFAULT_RETRY_STRATEGY).data".format(ListCommand, Extra))
-            except oci.exceptions.ServiceError as response:
-                if response.code == 404:
-                    print("No items found in compartment {}   ".format(Compartment.name), end="\r")
-                else:
-                    print("error {}-{} trying to list: {}".format(response.code, response.message, ServiceName))
-
-            for item in items:
-                if item.lifecycle_state.lower() not in ("deleted","terminated"):
-                    print("----------------------------------------------------")
-                    print(f'Service: {ServiceName}')
-                    # todo add category
-                    print(f'Region:', config["region"]) 
-                    print(f'Compartment:', compartment_name) 
-                    # print(f'Full Item contents for debug:')
-                    # print(item) 
-                    if hasattr(item, ObjectNameVar):
-                        print(f'{ObjectNameVar}: {getattr(item, ObjectNameVar)}')
-                    if hasattr(item, "lifecycle_state"):
-                        print(f'lifecycle_state: {item.lifecycle_state}')
-                    if hasattr(item, "id"):
-                        print(f'id: {item.id}')
-                    if hasattr(item, "compartment_id"):
-                        print(f'compartment_id: {item.compartment_id}')
-                # Extract and print tags (with placeholders for missing values)
-                    defined_tags = item.defined_tags if hasattr(item, "defined_tags") and item.defined_tags is not None else {}
-                    oracle_tags = defined_tags.get("Oracle-Tags", {}) if defined_tags else {}
-                    created_by_value = oracle_tags.get("CreatedBy", "MISSING")
-                    if created_by_value != "MISSING" and "/" in created_by_value:
-                        created_by_value = created_by_value.split("/")[-1]
-                    print(f'created_by: {created_by_value}')
-                    print(f'created_on: {oracle_tags.get("CreatedOn", "MISSING").split("T")[0] if oracle_tags.get("CreatedOn", "MISSING") != "MISSING" else "MISSING"}') 
-                    print(f'EOL: {oracle_tags.get("EOL", "MISSING")}')
-                    print(f'LifeTime: {oracle_tags.get("LifeTime", "MISSING")}')
-                    # Extract and print time_created
-                    if hasattr(item, "time_created"):
-                        time_created_str = item.time_created.strftime("%Y-%m-%d")  # Format the date
-                        print(f'time_created: {time_created_str}') 
-                    else:
-                        print('time_created: MISSING')
-                    print("----------------------------------------------------")
+        SafePrint("Getting all {} objects                 ".format(ServiceName), end="\r")
+
+        # config is changed by the caller for every region, so work units get their own copy
+        unitconfig = dict(config)
+
+        # The search unit of a failed search is replaced by the per compartment units,
+        # all listed by the shard that owns the search unit
+        if searchfailed:
+            journal = GetJournal()
+            if journal:
+                journal.replace(UnitKey(config["region"], ServiceClient, ServiceName, "search"),
+                                [UnitKey(config["region"], ServiceClient, ServiceName, C.details.id, ad) for C in Compartments for ad in ads])
+            ListUnits(unitconfig, object, Compartments, ServiceClient, ServiceName, ListCommand, ObjectNameVar, Extra, ads, sharded=False, GetCommand=GetCommand)
+            return
+
+        # Services listing a whole subtree in one paged call get a single work unit
+        if Subtree and not PerAD:
+            SubmitUnit(unitconfig, ServiceClient, ListSubtree, unitconfig, object, Compartments, ServiceClient, ServiceName, ListCommand, ObjectNameVar, Extra, Subtree, GetCommand)
+            return
+
+        ListUnits(unitconfig, object, Compartments, ServiceClient, ServiceName, ListCommand, ObjectNameVar, Extra, ads, GetCommand=GetCommand)
 
     except Exception as e:
-        print(f'\nError in ListAny, {ServiceClient}:{ServiceName}: {str(e)}')
+        SafePrint(f'\nError in ListAny, {ServiceClient}:{ServiceName}: {str(e)}')
 
@@ -0,0 +1,117 @@
+import contextvars
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ocimodules import functions
+from ocimodules.functions import print_header, CurrentTimeString
+from ocimodules.IAM import Login, SubscribedRegions, GetHomeRegion, GetTenantName, ProcessCompartments
+from ocimodules.Executor import SetExecutor
+from ocimodules.Records import CsvSink, OpenSinks, CurrentSinks, CloseSinks, ReplayRecords
+from ocimodules.Checkpoint import CheckpointJournal, SetJournal, WriteManifest
+from ocimodules.Registry import CompilePlan, RunRegions, PrintPlan
+from ocimodules.Cost import LoadCosts
+
+
+##########################################################################
+# ReadManifest
+# Runs of a batch, one per profile of --profiles (comma separated) and
+# per entry of the --manifest file, a json list like
+#   [{"profile": "prod", "name": "prod-a", "compartment": "ocid1...", "regions": "us-ashburn-1", "objects": "compute"}]
+# Only profile is needed, the others default to the command line (-c, -rg
+# and -o) and name to the profile. The name is part of the output files of
+# the run, so it must be unique (ValueError)
+##########################################################################
+def ReadManifest(profiles, manifest):
+    runs = [{"profile": profile.strip()} for profile in profiles.split(",") if profile.strip()]
+    if manifest:
+        with open(manifest, encoding="utf-8") as manifestfile:
+            runs.extend(json.load(manifestfile))
+    names = set()
+    for run in runs:
+        run.setdefault("profile", "")
+        run.setdefault("name", run["profile"] or "DEFAULT")
+        if run["name"] in names:
+            raise ValueError("more than one run named {}, give the runs of the same profile a unique \"name\"".format(run["name"]))
+        names.add(run["name"])
+    return runs
+
+
+##########################################################################
+# RunTenancy
+# Login, compartments and listing of one run of the batch. Runs in its own
+# context, with its own sinks and journal (<log file>.<name>.*) and its own
+# work group on the shared executor. With --plan only the plan of the
+# tenancy is printed
+##########################################################################
+def RunTenancy(cmd, run, logfile, regions, plan, formats, executor, shard=(0, 1)):
+    start = time.time()
+    config, signer = functions.create_signer(run["profile"], cmd.is_instance_principals, cmd.is_delegation_token)
+    config["tenancy_name"] = GetTenantName(config, signer)
+
+    compartments = Login(config, signer, run.get("compartment") or cmd.compartment or config["tenancy"], cmd.workers, cmd.subtree)
+    processCompartments, processRootCompartment = ProcessCompartments(compartments, config["tenancy"])
+    if run.get("regions"):
+        regions = run["regions"].split(",")
+    if len(regions) == 0:
+        regions = SubscribedRegions(config, signer)
+    homeregion = GetHomeRegion(config, signer)
+    if run.get("objects"):
+        plan = CompilePlan(run["objects"].split(","), False)
+
+    if cmd.plan:
+        print_header("Plan of " + run["name"] + " (" + config["tenancy_name"] + ")", 0)
+        PrintPlan(config, signer, plan, regions, homeregion, processCompartments)
+        return {"name": run["name"], "tenancy": config["tenancy_name"], "compartments": len(processCompartments), "regions": len(regions),
+                "records": 0, "seconds": time.time() - start, "csv": ""}
+
+    LoadCosts(config, signer, homeregion)
+
+    runlog = logfile + "." + run["name"]
+    OpenSinks(runlog, formats, compartments, not cmd.no_log_records)
+    journal = CheckpointJournal(runlog + ".journal", cmd.resume, shard)
+    SetJournal(journal)
+    if cmd.resume:
+        ReplayRecords(journal.records())
+    group = None
+    if executor:
+        group = executor.group()
+        SetExecutor(group)
+
+    try:
+        RunRegions(config, signer, plan, regions, homeregion, processCompartments, cmd.workers)
+    finally:
+        if group:
+            group.shutdown()
+        records = sum(sink.rows for sink in CurrentSinks() if isinstance(sink, CsvSink))
+        CloseSinks()
+        journal.close()
+    if shard[1] > 1:
+        WriteManifest(runlog + ".manifest.json", journal, runlog + ".csv", records)
+
+    return {"name": run["name"], "tenancy": config["tenancy_name"], "compartments": len(processCompartments), "regions": len(regions),
+            "records": records, "seconds": time.time() - start, "csv": runlog + ".csv"}
+
+
+##########################################################################
+# RunBatch
+# Runs all tenancies of the batch concurrently, sharing the executor and
+# the rate controller. Returns the summaries of the completed runs.
+# The plans of --plan are printed one tenancy after the other
+##########################################################################
+def RunBatch(cmd, runs, logfile, regions, plan, formats, executor, shard=(0, 1)):
+    results = []
+    with ThreadPoolExecutor(max_workers=1 if cmd.plan else max(1, len(runs)), thread_name_prefix="tenancy") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, RunTenancy, cmd, run, logfile, list(regions), plan, formats, executor, shard) for run in runs]
+        for run, future in zip(runs, futures):
+            try:
+                results.append(future.result())
+            except (Exception, SystemExit) as e:
+                print("Error in batch run {}: {}".format(run["name"], str(e)))
+    if cmd.plan:
+        return results
+
+    print_header("Batch complete at " + CurrentTimeString(), 0)
+    for result in results:
+        print("{:<20} {:<30} {:>6} compartments {:>3} regions {:>9} records {:>8.1f}s  {}".format(
+            result["name"], result["tenancy"], result["compartments"], result["regions"], result["records"], result["seconds"], result["csv"]))
+    return results
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+import oci
+from concurrent.futures import ThreadPoolExecutor
+from ocimodules.AnyList import ListCommandName
+from ocimodules.Clients import GetClient
+from ocimodules.Executor import DefaultWorkers
+from ocimodules.IAM import GetAvailabilityDomains
+from ocimodules.RateLimit import Limited
+from ocimodules.Search import SearchSupported
+
+DefaultTTL = 24        # hours a cached probe result is used
+ProbeAttempts = 3      # attempts of a probe failing with a transport error
+ProbeBackoff = 2       # seconds before the next attempt, doubled every attempt
+
+# Transport errors of an endpoint whose host name does not exist (DNS)
+NameResolutionErrors = ("NameResolutionError", "Failed to resolve", "Name or service not known", "nodename nor servname", "getaddrinfo failed", "No address associated")
+
+# Probe results per "region|ServiceClient": {"available": bool, "checked": epoch, "reason": str}
+Capabilities = {}
+CapabilityLock = threading.Lock()
+Enabled = True
+CacheFile = ""
+TTL = DefaultTTL * 3600
+
+
+##########################################################################
+# SetProbe
+# Enables the probe and loads the results of the disk cache that are
+# younger than ttl hours
+##########################################################################
+def SetProbe(enabled=True, cachefile="", ttl=DefaultTTL):
+    global Enabled, CacheFile, TTL
+    Enabled = enabled
+    CacheFile = cachefile
+    TTL = ttl * 3600
+    if CacheFile and os.path.exists(CacheFile):
+        try:
+            with open(CacheFile, encoding="utf-8") as cache:
+                entries = json.load(cache)
+        except ValueError:
+            entries = {}
+        now = time.time()
+        with CapabilityLock:
+            for key, entry in entries.items():
+                if now - entry.get("checked", 0) < TTL:
+                    Capabilities[key] = entry
+
+
+def SaveCache():
+    if not CacheFile:
+        return
+    with CapabilityLock:
+        entries = dict(Capabilities)
+    with open(CacheFile + ".tmp", "w", encoding="utf-8") as cache:
+        json.dump(entries, cache, indent=1)
+    os.replace(CacheFile + ".tmp", CacheFile)
+
+
+##########################################################################
+# Probe
+# Calls the list operation of a service once, for one item in the
+# tenancy. Only an endpoint whose host name does not resolve or a not
+# implemented (501) answer mean the service is not available in the
+# region, authorization errors are left to the listing itself.
+# Other transport errors (timeouts, resets) are tried again, if they
+# persist the service is kept and the result is not cached.
+# Returns available, reason and if the result can be cached
+##########################################################################
+def Probe(config, signer, ServiceClient, ServiceName, options):
+    for attempt in range(ProbeAttempts):
+        try:
+            client = GetClient(ServiceClient, config, signer)
+            kwargs = {}
+            if options.get("PerAD"):
+                kwargs["availability_domain"] = GetAvailabilityDomains(config, signer)[0].name
+            operation = getattr(client, options.get("ListCommand") or ListCommandName(ServiceName))
+            Limited(client, operation)(compartment_id=config["tenancy"], limit=1, retry_strategy=oci.retry.NoneRetryStrategy(), **kwargs)
+        except (oci.exceptions.RequestException, oci.exceptions.ConnectTimeout) as e:
+            if NameResolutionFailed(e):
+                return False, "endpoint not reachable: " + str(e).split("\n")[0][:120], True
+            if attempt + 1 < ProbeAttempts:
+                time.sleep(ProbeBackoff * 2 ** attempt)
+                continue
+            print("Probe of {} in {} failed ({}), listing it anyway".format(ServiceClient, config["region"], str(e).split("\n")[0][:80]))
+            return True, "", False
+        except oci.exceptions.ServiceError as e:
+            if e.status == 501:
+                return False, "{} {}".format(e.status, e.code), True
+        except Exception:
+            pass
+        return True, "", True
+
+
+def NameResolutionFailed(error):
+    text = str(error)
+    return any(marker in text for marker in NameResolutionErrors)
+
+
+##########################################################################
+# Available
+# Probes ServiceClient in the region of config, once per cache TTL.
+# Results of a failed probe are not kept, the next run probes again
+##########################################################################
+def Available(config, signer, ServiceClient, ServiceName, options):
+    key = config["region"] + "|" + ServiceClient
+    with CapabilityLock:
+        entry = Capabilities.get(key)
+    if entry is None:
+        available, reason, cacheable = Probe(config, signer, ServiceClient, ServiceName, options)
+        entry = {"available": available, "checked": time.time(), "reason": reason}
+        if cacheable:
+            with CapabilityLock:
+                Capabilities[key] = entry
+    return entry["available"]
+
+
+##########################################################################
+# ProbePlan
+# Returns the entries of the (region) plan whose service is available in
+# the region of config. Every service endpoint is probed once, in parallel
+##########################################################################
+def ProbePlan(config, signer, plan, workers=DefaultWorkers):
+    if not Enabled:
+        return plan
+    probes = {}
+    for category, ServiceClient, ServiceName, options in plan:
+        if not SearchSupported(ServiceClient, ServiceName):
+            probes.setdefault(ServiceClient, (ServiceClient, ServiceName, options))
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="probe") as pool:
+        results = dict(zip(probes.keys(), pool.map(lambda probe: Available(config, signer, *probe), probes.values())))
+    SaveCache()
+
+    available = []
+    for entry in plan:
+        if results.get(entry[1], True):
+            available.append(entry)
+        else:
+            print("Skipping {} {}, not available in {} ({})".format(entry[1], entry[2], config["region"], Capabilities[config["region"] + "|" + entry[1]]["reason"]))
+    return available
+
+
+##########################################################################
+# CachedPlan
+# ProbePlan without probing, for --plan: the services known to be not
+# available (--probe-cache) are left out, the others are kept. Returns
+# the plan and the number of probe calls the listing would make
+##########################################################################
+def CachedPlan(config, plan):
+    if not Enabled:
+        return plan, 0
+    available = []
+    probes = set()
+    for entry in plan:
+        if SearchSupported(entry[1], entry[2]):
+            available.append(entry)
+            continue
+        with CapabilityLock:
+            cached = Capabilities.get(config["region"] + "|" + entry[1])
+        if cached is None:
+            probes.add(entry[1])
+        if cached is None or cached["available"]:
+            available.append(entry)
+    return available, len(probes)
@@ -0,0 +1,186 @@
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+SyncInterval = 1.0     # seconds between fsyncs of the journal
+SyncUnits = 100        # units committed between fsyncs of the journal
+
+# Journal of the current run (context), None means no checkpointing
+Journal = contextvars.ContextVar("Journal", default=None)
+
+
+##########################################################################
+# CheckpointJournal
+# Append-only journal of completed work units and their records,
+# one JSON line per unit, written to the file when the unit completes and
+# synced to disk every SyncInterval seconds or SyncUnits units.
+# Only the keys of the completed units are kept in memory, the records of
+# a resumed run are read back from the file.
+# On resume a torn last line (killed mid-write) is ignored and cut off
+##########################################################################
+class CheckpointJournal:
+
+    def __init__(self, filename, resume=False, shard=(0, 1)):
+        self.filename = filename
+        self.completed = set()
+        self.lock = threading.Lock()
+        self.unsynced = 0
+        self.synced = time.monotonic()
+
+        # Units of the plan seen by this run and the units of its shard (--shard i/N),
+        # units replaced by others (a failed subtree unit by its per compartment units)
+        # and units whose listing failed with an error answer, with its code
+        self.shard = shard
+        self.planned = 0
+        self.planned_digest = 0
+        self.owned = set()
+        self.replaced = {}
+        self.failed = {}
+
+        # Bytes of the journal written by the previous run
+        self.resumed = 0
+        if resume and os.path.isfile(filename):
+            valid = 0
+            with open(filename, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        entry = json.loads(line.decode("utf-8"))
+                        self.completed.add(entry["unit"])
+                    except (ValueError, KeyError):
+                        break
+                    valid += len(line)
+            with open(filename, "r+b") as f:
+                f.truncate(valid)
+            self.resumed = valid
+        else:
+            open(filename, "w").close()
+
+        self.journal = open(filename, "a", encoding="utf-8")
+
+    def done(self, unit):
+        return unit in self.completed
+
+    def commit(self, unit, records):
+        line = json.dumps({"unit": unit, "records": records}) + "\n"
+        with self.lock:
+            self.journal.write(line)
+            self.journal.flush()
+            self.completed.add(unit)
+            self.unsynced += 1
+            if self.unsynced >= SyncUnits or time.monotonic() - self.synced >= SyncInterval:
+                self.sync()
+
+    def sync(self):
+        # Called with the lock held
+        os.fsync(self.journal.fileno())
+        self.unsynced = 0
+        self.synced = time.monotonic()
+
+    def records(self):
+        # Records of the units completed by the previous run, streamed from the journal
+        with open(self.filename, "rb") as f:
+            for line in f:
+                if f.tell() > self.resumed:
+                    break
+                for record in json.loads(line.decode("utf-8"))["records"]:
+                    yield record
+
+    def owns(self, unit):
+        # Every unit of the plan passes here once, returns if it is listed by this shard
+        owned = ShardOf(unit, self.shard[1]) == self.shard[0]
+        with self.lock:
+            self.planned += 1
+            self.planned_digest ^= UnitDigest(unit)
+            if owned:
+                self.owned.add(unit)
+        return owned
+
+    def replace(self, unit, units):
+        with self.lock:
+            self.replaced[unit] = list(units)
+
+    def fail(self, unit, code):
+        # The unit was attempted and the service answered with an error, it is not journaled
+        # so a resume tries it again
+        with self.lock:
+            self.failed[unit] = str(code)
+
+    def manifest(self):
+        # Shard summary for the merge: the plan as count and digest, the units of the
+        # shard, the ones that failed with an error answer and the ones that were not attempted
+        with self.lock:
+            missing = []
+            failed = {}
+            for unit in sorted(self.owned):
+                units = self.replaced.get(unit, [unit]) if unit not in self.completed else []
+                for u in units:
+                    if u in self.completed:
+                        continue
+                    if u in self.failed:
+                        failed[u] = self.failed[u]
+                    else:
+                        missing.append(unit)
+                        break
+            owned_digest = 0
+            for unit in self.owned:
+                owned_digest ^= UnitDigest(unit)
+            return {"shard": self.shard[0], "count": self.shard[1], "planned": self.planned, "planned_digest": "{:016x}".format(self.planned_digest),
+                    "owned": len(self.owned), "owned_digest": "{:016x}".format(owned_digest), "missing": missing, "failed": failed}
+
+    def close(self):
+        with self.lock:
+            self.journal.flush()
+            self.sync()
+            self.journal.close()
+
+
+def UnitKey(region, ServiceClient, ServiceName, compartment_id, AvailabilityDomain=None):
+    return "|".join([region, ServiceClient, ServiceName, compartment_id, AvailabilityDomain or ""])
+
+
+##########################################################################
+# ShardOf / UnitDigest
+# Shard of a unit (stable across processes, unlike hash()) and its digest,
+# xor-ed over a set of units so sets can be compared without listing them
+##########################################################################
+def ShardOf(unit, count):
+    return zlib.crc32(unit.encode("utf-8")) % count
+
+
+def UnitDigest(unit):
+    return int.from_bytes(hashlib.sha1(unit.encode("utf-8")).digest()[:8], "big")
+
+
+def ParseShard(shard):
+    # "i/N" -> (i, N), shards are numbered from 0
+    index, count = (int(x) for x in shard.split("/"))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError("shard must be i/N with 0 <= i < N")
+    return index, count
+
+
+##########################################################################
+# WriteManifest
+# Manifest of a shard run, with its csv file, for merge (shard.py merge)
+##########################################################################
+def WriteManifest(filename, journal, csv_file, records):
+    manifest = journal.manifest()
+    manifest["csv"] = os.path.relpath(csv_file, os.path.dirname(os.path.abspath(filename)))
+    manifest["records"] = records
+    with open(filename + ".tmp", "w", encoding="utf-8") as manifestfile:
+        json.dump(manifest, manifestfile, indent=1)
+    os.replace(filename + ".tmp", filename)
+
+
+def SetJournal(journal):
+    Journal.set(journal)
+
+
+def GetJournal():
+    return Journal.get()
@@ -0,0 +1,83 @@
+import importlib
+import oci
+import threading
+from oci._vendor.requests.adapters import HTTPAdapter
+
+# HTTP connections kept open per client, should be at least the per endpoint workers
+DefaultPoolSize = 10
+PoolSize = DefaultPoolSize
+
+# Clients per (ServiceClient, region, signer), shared by all listings
+Clients = {}
+Regions = {}
+Adapters = []
+ClientsBuilt = 0
+ClientLock = threading.Lock()
+
+# Builds clients instead of the SDK when set, e.g. the fakes of the offline benchmark
+ClientFactory = None
+
+
+def SetPoolSize(size):
+    global PoolSize
+    PoolSize = size
+
+
+def SetClientFactory(factory):
+    global ClientFactory
+    ClientFactory = factory
+
+
+##########################################################################
+# GetClient
+# Returns the client for ServiceClient (e.g. "core.ComputeClient") in the
+# region of the config, building it only on first use
+##########################################################################
+def GetClient(ServiceClient, config, signer):
+    key = (ServiceClient, config["region"], signer)
+    with ClientLock:
+        client = Clients.get(key)
+        if client is None:
+            client = BuildClient(ServiceClient, config, signer)
+            Clients[key] = client
+            Regions[id(client)] = config["region"]
+        return client
+
+
+def ClientRegion(client):
+    return Regions.get(id(client))
+
+
+def BuildClient(ServiceClient, config, signer):
+    global ClientsBuilt
+    if ClientFactory:
+        client = ClientFactory(ServiceClient, config, signer)
+    else:
+        # Only the SDK modules of the services that are listed get imported
+        module, classname = ServiceClient.rsplit(".", 1)
+        clientclass = getattr(importlib.import_module("oci." + module), classname)
+        client = clientclass(config, signer=signer)
+
+    # Replace the default connection pool, so concurrent workers reuse keep-alive connections
+    adapterclass = getattr(oci.base_client, "OCIHTTPAdapter", HTTPAdapter)
+    adapter = adapterclass(pool_connections=PoolSize, pool_maxsize=PoolSize)
+    client.base_client.session.mount("https://", adapter)
+    Adapters.append(adapter)
+    ClientsBuilt += 1
+    return client
+
+
+##########################################################################
+# ConnectionsOpened
+# Number of HTTP connections opened by all cached clients
+##########################################################################
+def ConnectionsOpened():
+    opened = 0
+    with ClientLock:
+        for adapter in Adapters:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    opened += pool.num_connections
+    return opened
@@ -0,0 +1,101 @@
+import datetime
+import importlib
+import threading
+import oci
+from ocimodules.Clients import GetClient
+from ocimodules.RateLimit import Limited, GetRetryStrategy
+
+WindowDays = 0         # --cost-days, 0 means no cost column
+MaxRequestDays = 30    # days of one request_summarized_usages call
+
+# Cost of the window per resource OCID (lower case), of all tenancies of the run
+Costs = {}
+Currency = ""
+Joined = set()
+# Tenancies whose costs were read
+Tenancies = set()
+CostLock = threading.Lock()
+
+
+def SetCostWindow(days):
+    global WindowDays
+    WindowDays = days
+
+
+def CostWindow():
+    # Whole days (UTC) up to today, as the Usage API needs for DAILY
+    end = datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return end - datetime.timedelta(days=WindowDays), end
+
+
+##########################################################################
+# LoadCosts
+# Reads the cost of every resource of the tenancy in the cost window from
+# the Usage API (home region), grouped by resourceId and summed over the
+# window, one paged call per MaxRequestDays. Returns the number of resources
+##########################################################################
+def LoadCosts(config, signer, homeregion):
+    global Currency
+    if not WindowDays:
+        return 0
+    usageconfig = dict(config)
+    usageconfig["region"] = homeregion
+    usage = GetClient("usage_api.UsageapiClient", usageconfig, signer)
+    models = importlib.import_module("oci.usage_api.models")
+
+    start, end = CostWindow()
+    costs = {}
+    currency = ""
+    while start < end:
+        stop = min(end, start + datetime.timedelta(days=MaxRequestDays))
+        details = models.RequestSummarizedUsagesDetails(tenant_id=config["tenancy"], time_usage_started=start, time_usage_ended=stop,
+                                                        granularity="DAILY", is_aggregate_by_time=True, query_type="COST", group_by=["resourceId"])
+        try:
+            items = oci.pagination.list_call_get_all_results(Limited(usage, usage.request_summarized_usages), details, retry_strategy=GetRetryStrategy()).data
+        except oci.exceptions.ServiceError as response:
+            print("error {}-{} trying to read costs, no cost column for {}".format(response.code, response.message, config.get("tenancy_name", config["tenancy"])))
+            return 0
+        for item in items:
+            if item.resource_id and item.computed_amount:
+                key = item.resource_id.lower()
+                costs[key] = costs.get(key, 0.0) + item.computed_amount
+                currency = currency or item.currency or ""
+        start = stop
+
+    with CostLock:
+        Costs.update(costs)
+        Tenancies.add(config["tenancy"])
+        Currency = Currency or currency
+    return len(costs)
+
+
+##########################################################################
+# ResourceCost
+# Cost of ocid of tenancy in the window, for the Cost column. Resources
+# without usage cost 0, None when the costs of tenancy were not read
+##########################################################################
+def ResourceCost(tenancy, ocid):
+    if not WindowDays or not ocid:
+        return None
+    key = ocid.lower()
+    with CostLock:
+        if tenancy not in Tenancies:
+            return None
+        if key not in Costs:
+            return "0.00"
+        Joined.add(key)
+        return "{:.2f}".format(Costs[key])
+
+
+##########################################################################
+# PrintCosts
+# Cost of the listed resources against the total of the window, the rest
+# is spent by resources (types) that are not listed
+##########################################################################
+def PrintCosts():
+    if not WindowDays:
+        return
+    with CostLock:
+        total = sum(Costs.values())
+        listed = sum(Costs[key] for key in Joined)
+    print("Cost (last {} days)  : {:.2f} {} of listed resources, {:.2f} {} in total".format(WindowDays, listed, Currency, total, Currency))
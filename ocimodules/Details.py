@@ -0,0 +1,179 @@
+import datetime
+import threading
+import oci
+from concurrent.futures import ThreadPoolExecutor
+from ocimodules.Executor import DefaultWorkers
+from ocimodules.RateLimit import Limited, GetRetryStrategy
+from ocimodules.Records import SafePrint
+
+# Detail level of the run (--detail)
+#   0: no details
+#   1: sizing of the objects below (shape, OCPUs, memory, storage)
+#   2: level 1 and their configuration (placement, versions, licensing)
+#   3: all attributes of every listed object that has a get_* operation
+# Fields are taken from the listed item when it has them, get_* is only
+# called for the items that miss a field of the level
+Level = 0
+
+# Detail fields per object: (level, name, attribute path on the item)
+DetailFields = {
+    ("core.ComputeClient", "instance"): [
+        (1, "shape", "shape"), (1, "ocpus", "shape_config.ocpus"), (1, "memory_in_gbs", "shape_config.memory_in_gbs"),
+        (2, "availability_domain", "availability_domain"), (2, "fault_domain", "fault_domain"), (2, "processor", "shape_config.processor_description")],
+    ("core.BlockstorageClient", "volume"): [
+        (1, "size_in_gbs", "size_in_gbs"), (1, "vpus_per_gb", "vpus_per_gb"),
+        (2, "availability_domain", "availability_domain"), (2, "is_auto_tune_enabled", "is_auto_tune_enabled")],
+    ("core.BlockstorageClient", "boot_volume"): [
+        (1, "size_in_gbs", "size_in_gbs"), (1, "vpus_per_gb", "vpus_per_gb"),
+        (2, "availability_domain", "availability_domain"), (2, "is_auto_tune_enabled", "is_auto_tune_enabled")],
+    ("core.BlockstorageClient", "volume_backup"): [
+        (1, "size_in_gbs", "size_in_gbs"), (1, "unique_size_in_gbs", "unique_size_in_gbs"),
+        (2, "type", "type"), (2, "source_type", "source_type"), (2, "expiration_time", "expiration_time")],
+    ("core.BlockstorageClient", "boot_volume_backup"): [
+        (1, "size_in_gbs", "size_in_gbs"), (1, "unique_size_in_gbs", "unique_size_in_gbs"),
+        (2, "type", "type"), (2, "source_type", "source_type"), (2, "expiration_time", "expiration_time")],
+    ("database.DatabaseClient", "db_system"): [
+        (1, "shape", "shape"), (1, "cpu_core_count", "cpu_core_count"), (1, "data_storage_size_in_gbs", "data_storage_size_in_gbs"), (1, "node_count", "node_count"),
+        (2, "database_edition", "database_edition"), (2, "license_model", "license_model"), (2, "version", "version")],
+    ("database.DatabaseClient", "autonomous_database"): [
+        (1, "compute_model", "compute_model"), (1, "compute_count", "compute_count"), (1, "cpu_core_count", "cpu_core_count"), (1, "data_storage_size_in_tbs", "data_storage_size_in_tbs"),
+        (2, "db_workload", "db_workload"), (2, "db_version", "db_version"), (2, "license_model", "license_model"), (2, "is_free_tier", "is_free_tier")],
+    ("mysql.DbSystemClient", "db_system"): [
+        (1, "shape", "shape_name"), (1, "data_storage_size_in_gbs", "data_storage_size_in_gbs"),
+        (2, "mysql_version", "mysql_version"), (2, "is_highly_available", "is_highly_available"), (2, "availability_domain", "availability_domain")],
+}
+
+# Attributes already in the record, or too large for it, left out of level 3
+RecordAttributes = {"id", "compartment_id", "display_name", "name", "lifecycle_state", "time_created", "defined_tags", "freeform_tags", "system_tags"}
+
+# get_* results of the run per OCID (the future, so concurrent units share one call)
+Cache = {}
+CacheLock = threading.Lock()
+Pool = None
+
+
+##########################################################################
+# SetDetail
+# Sets the detail level and the pool running the get_* calls, bounded to
+# workers concurrent calls (next to the endpoint limits of the controller)
+##########################################################################
+def SetDetail(level, workers=DefaultWorkers):
+    global Level, Pool
+    Level = level
+    if Level and Pool is None:
+        Pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="detail")
+
+
+def Attribute(item, path):
+    value = item
+    for name in path.split("."):
+        value = getattr(value, name, None)
+        if value is None:
+            return None
+    return value
+
+
+# Escapes of the characters that would break the "name=value; ..." format or the log blocks
+Escapes = {"\\": "\\\\", "\n": "\\n", "\r": "\\r", ";": "\\;"}
+Unescapes = {"\\": "\\", "n": "\n", "r": "\r", ";": ";"}
+
+
+def FormatValue(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d")
+    return "".join(Escapes.get(c, c) for c in str(value))
+
+
+##########################################################################
+# ParseDetails
+# Returns the name -> value pairs of a Details column (the reverse of
+# ItemDetails), with the escaped characters of the values restored
+##########################################################################
+def ParseDetails(details):
+    pairs = {}
+    name, text = None, []
+    escaped = False
+    for c in details + ";":
+        if escaped:
+            text.append(Unescapes.get(c, c))
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif c == "=" and name is None:
+            name, text = "".join(text).strip(), []
+        elif c == ";":
+            if name is not None:
+                pairs[name] = "".join(text)
+            name, text = None, []
+        else:
+            text.append(c)
+    return pairs
+
+
+##########################################################################
+# GetItem
+# Future of the full object of ocid, one get_* call per OCID for the run.
+# Its result is None if the object can't be read
+##########################################################################
+def GetItem(client, GetCommand, ocid):
+    with CacheLock:
+        future = Cache.get(ocid)
+        if future is None:
+            future = Pool.submit(CallGet, client, GetCommand, ocid)
+            Cache[ocid] = future
+    return future
+
+
+def CallGet(client, GetCommand, ocid):
+    try:
+        return Limited(client, getattr(client, GetCommand))(ocid, retry_strategy=GetRetryStrategy()).data
+    except oci.exceptions.ServiceError as response:
+        SafePrint("error {}-{} trying to get details: {}".format(response.code, response.message, ocid))
+    except Exception as e:
+        SafePrint("error trying to get details: {} {}".format(ocid, str(e)[:80]))
+    return None
+
+
+def LevelFields(ServiceClient, ServiceName):
+    return [(name, path) for level, name, path in DetailFields.get((ServiceClient, ServiceName), []) if level <= Level]
+
+
+def NeedsGet(fields, item):
+    return Level >= 3 or any(Attribute(item, path) is None for name, path in fields)
+
+
+##########################################################################
+# ItemDetails
+# Returns the "name=value; ..." details of one item, from the full object
+# if it was read, else from the listed item
+##########################################################################
+def ItemDetails(fields, item, full):
+    source = full if full is not None else item
+    values = [(name, Attribute(source, path)) for name, path in fields]
+
+    if Level >= 3 and full is not None:
+        known = set(path for name, path in fields) | RecordAttributes
+        attributes = getattr(full, "swagger_types", None) or vars(full)
+        for name in sorted(attributes):
+            value = getattr(full, name, None)
+            if name not in known and isinstance(value, (str, int, float, bool, datetime.datetime)):
+                values.append((name, value))
+
+    return "; ".join("{}={}".format(name, FormatValue(value)) for name, value in values if value is not None)
+
+
+##########################################################################
+# Enrich
+# Adds the Details to the records of the listed items (same order). The
+# get_* calls of all items are started first and run concurrently on the
+# detail pool, then the unit waits for them
+##########################################################################
+def Enrich(client, ServiceClient, ServiceName, GetCommand, items, records):
+    if not Level or not records:
+        return
+    fields = LevelFields(ServiceClient, ServiceName)
+    if not fields and (Level < 3 or not hasattr(client, GetCommand)):
+        return
+    futures = [GetItem(client, GetCommand, item.id) if NeedsGet(fields, item) else None for item in items]
+    for item, record, future in zip(items, records, futures):
+        record['Details'] = ItemDetails(fields, item, future.result() if future else None)
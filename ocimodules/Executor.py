@@ -0,0 +1,117 @@
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+DefaultWorkers = 8
+DefaultEndpointWorkers = 4
+
+# Executor used by ListAny in the current run (context), None means list serially
+CurrentExecutor = contextvars.ContextVar("CurrentExecutor", default=None)
+
+
+##########################################################################
+# WorkExecutor
+# Bounded thread pool running listing work units.
+# Global concurrency is the pool size, per endpoint concurrency is limited
+# by queueing the units of an endpoint (ServiceClient@region) that has
+# max_per_endpoint units running. When a unit finishes, the next unit of
+# its endpoint goes to the back of the pool queue, so the units of all
+# endpoints are interleaved and no worker waits for an endpoint
+##########################################################################
+class WorkExecutor:
+
+    def __init__(self, max_workers=DefaultWorkers, max_per_endpoint=DefaultEndpointWorkers):
+        self.max_workers = max_workers
+        self.max_per_endpoint = max_per_endpoint
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="superlist")
+        # endpoint -> [units running or in the pool queue, units waiting for the endpoint]
+        self.endpoints = {}
+        self.dispatch_lock = threading.Lock()
+        self.futures = []
+        self.lock = threading.Lock()
+
+    def dispatch(self, endpoint, unit):
+        with self.dispatch_lock:
+            state = self.endpoints.setdefault(endpoint, [0, deque()])
+            if state[0] >= self.max_per_endpoint:
+                state[1].append(unit)
+                return
+            state[0] += 1
+        self.pool.submit(self.run, endpoint, unit)
+
+    def run(self, endpoint, unit):
+        context, future, fn, args, kwargs = unit
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(context.run(fn, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+        with self.dispatch_lock:
+            state = self.endpoints[endpoint]
+            if not state[1]:
+                state[0] -= 1
+                return
+            unit = state[1].popleft()
+        self.pool.submit(self.run, endpoint, unit)
+
+    def submit(self, endpoint, fn, *args, **kwargs):
+        # Work units run in the context of the run that submitted them (sinks, journal)
+        future = Future()
+        with self.lock:
+            self.futures.append(future)
+        self.dispatch(endpoint, (contextvars.copy_context(), future, fn, args, kwargs))
+        return future
+
+    def wait(self):
+        # Wait for all submitted work units, including the units they submit,
+        # returns the exceptions raised by them
+        errors = []
+        while True:
+            with self.lock:
+                futures = self.futures
+                self.futures = []
+            if not futures:
+                return errors
+            wait(futures)
+            errors.extend(f.exception() for f in futures if f.exception() is not None)
+
+    def shutdown(self):
+        self.wait()
+        self.pool.shutdown(wait=True)
+
+    def group(self):
+        return WorkGroup(self)
+
+
+##########################################################################
+# WorkGroup
+# Work units of one run (tenancy) on a shared WorkExecutor. Shares the
+# pool and the endpoint queues, but waits only for its own units
+##########################################################################
+class WorkGroup(WorkExecutor):
+
+    def __init__(self, executor):
+        self.max_workers = executor.max_workers
+        self.max_per_endpoint = executor.max_per_endpoint
+        self.pool = executor.pool
+        self.executor = executor
+        self.futures = []
+        self.lock = threading.Lock()
+
+    def dispatch(self, endpoint, unit):
+        self.executor.dispatch(endpoint, unit)
+
+    def shutdown(self):
+        self.wait()
+
+
+##########################################################################
+# SetExecutor / GetExecutor
+##########################################################################
+def SetExecutor(executor):
+    CurrentExecutor.set(executor)
+
+
+def GetExecutor():
+    return CurrentExecutor.get()
@@ -0,0 +1,276 @@
+import datetime
+import importlib
+import random
+import threading
+import time
+import oci
+import oci.identity
+from oci._vendor import requests
+from ocimodules import Clients
+from ocimodules import functions
+
+##########################################################################
+# Fake OCI service layer for the offline benchmark.
+# Replaces the SDK clients built by Clients.GetClient with local fakes
+# serving a synthetic tenancy, with paging, latency and injected 429s
+##########################################################################
+
+TenancyId = "ocid1.tenancy.oc1..benchmark"
+UserId = "ocid1.user.oc1..benchmark"
+Created = datetime.datetime(2024, 1, 1)
+
+
+##########################################################################
+# FakeTenancy
+# Synthetic compartment tree (breadth first, width subcompartments per
+# compartment) and the settings of the fake services
+##########################################################################
+class FakeTenancy:
+
+    def __init__(self, compartments=100, width=5, resources=2, page_size=100, latency=0.0, throttle_rate=0.0, retry_after=1.0, regions=("us-ashburn-1",), ads=3, seed=1, unavailable=()):
+        self.resources = resources
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.regions = list(regions)
+        self.ads = ads
+        # ServiceClients without an endpoint, their calls fail as on a region without the service
+        self.unavailable = set(unavailable)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.throttles = 0
+
+        self.children = {}
+        self.compartments = []
+        parents = [TenancyId]
+        while len(self.compartments) < compartments:
+            nextparents = []
+            for parent in parents:
+                for w in range(width):
+                    if len(self.compartments) >= compartments:
+                        break
+                    compartment = oci.identity.models.Compartment(
+                        id="ocid1.compartment.oc1..bench{}".format(len(self.compartments)),
+                        compartment_id=parent,
+                        name="compartment{}".format(len(self.compartments)),
+                        lifecycle_state="ACTIVE",
+                        time_created=Created)
+                    self.compartments.append(compartment)
+                    self.children.setdefault(parent, []).append(compartment)
+                    nextparents.append(compartment.id)
+            parents = nextparents
+
+    def call(self, operation):
+        # Every page of every operation passes here
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            throttled = self.throttle_rate and self.random.random() < self.throttle_rate
+            if throttled:
+                self.throttles += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttled:
+            raise oci.exceptions.ServiceError(429, "TooManyRequests", {"retry-after": str(self.retry_after)}, "Too many requests for the user")
+
+    def subtree(self, compartment_id):
+        # compartment_id and all compartments below it
+        compartment_ids = [compartment_id]
+        for parent_id in compartment_ids:
+            compartment_ids.extend(c.id for c in self.children.get(parent_id, []))
+        return compartment_ids
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
+
+
+##########################################################################
+# FakeResponse / Page
+# Response with the attributes used by oci.pagination
+##########################################################################
+class FakeResponse:
+
+    def __init__(self, data, next_page=None):
+        self.data = data
+        self.next_page = next_page
+        self.has_next_page = next_page is not None
+        self.status = 200
+        self.headers = {}
+        self.request = None
+
+
+def Page(items, page, page_size):
+    start = int(page) if page else 0
+    end = start + page_size
+    return FakeResponse(items[start:end], str(end) if end < len(items) else None)
+
+
+class FakeItem:
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeBaseClient:
+
+    def __init__(self, ServiceClient, region):
+        self.session = requests.Session()
+        self.endpoint = "https://{}.{}.fake".format(ServiceClient.split(".")[0], region)
+
+
+##########################################################################
+# FakeIdentityClient
+##########################################################################
+class FakeIdentityClient:
+
+    def __init__(self, tenancy, ServiceClient, config):
+        self.tenancy = tenancy
+        self.region = config["region"]
+        self.base_client = FakeBaseClient(ServiceClient, self.region)
+
+    def get_user(self, user_id, **kwargs):
+        self.tenancy.call("get_user")
+        return FakeResponse(FakeItem(id=user_id, description="benchmark user"))
+
+    def get_tenancy(self, tenancy_id, **kwargs):
+        self.tenancy.call("get_tenancy")
+        return FakeResponse(FakeItem(id=tenancy_id, name="benchmark"))
+
+    def get_compartment(self, compartment_id, **kwargs):
+        self.tenancy.call("get_compartment")
+        return FakeResponse(oci.identity.models.Compartment(id=compartment_id, name="root compartment", lifecycle_state="ACTIVE"))
+
+    def list_compartments(self, compartment_id, compartment_id_in_subtree=False, page=None, sort_by=None, sort_order="ASC", limit=None, **kwargs):
+        self.tenancy.call("list_compartments")
+        if compartment_id_in_subtree:
+            compartments = self.tenancy.compartments
+            if sort_by == "TIMECREATED":
+                compartments = sorted(compartments, key=lambda c: c.time_created, reverse=(sort_order == "DESC"))
+            return Page(compartments, page, limit or self.tenancy.page_size)
+        return Page(self.tenancy.children.get(compartment_id, []), page, self.tenancy.page_size)
+
+    def list_region_subscriptions(self, tenancy_id, **kwargs):
+        self.tenancy.call("list_region_subscriptions")
+        regions = [oci.identity.models.RegionSubscription(region_name=region, is_home_region=(n == 0), status="READY") for n, region in enumerate(self.tenancy.regions)]
+        return FakeResponse(regions)
+
+    def list_availability_domains(self, compartment_id, **kwargs):
+        self.tenancy.call("list_availability_domains")
+        return FakeResponse([oci.identity.models.AvailabilityDomain(name="BENCH:{}-AD-{}".format(self.region, n + 1), compartment_id=compartment_id) for n in range(self.tenancy.ads)])
+
+    def __getattr__(self, name):
+        return FakeServiceClient.operation(self, name)
+
+
+##########################################################################
+# FakeServiceClient
+# Serves any list_* operation with resources per compartment (and AD)
+# any get_* operation with the sizing of every kind of object and the
+# Usage API costs of the instances and configurations
+##########################################################################
+class FakeServiceClient:
+
+    def __init__(self, tenancy, ServiceClient, config):
+        self.tenancy = tenancy
+        self.region = config["region"]
+        self.base_client = FakeBaseClient(ServiceClient, self.region)
+        self.available = ServiceClient not in tenancy.unavailable
+
+    def __getattr__(self, name):
+        return FakeServiceClient.operation(self, name)
+
+    @staticmethod
+    def operation(client, name):
+        if name.startswith("list_"):
+            def list_operation(compartment_id=None, availability_domain=None, page=None, compartment_id_in_subtree=False, **kwargs):
+                client.tenancy.call(name)
+                if not getattr(client, "available", True):
+                    raise oci.exceptions.RequestException("Failed to resolve " + client.base_client.endpoint)
+                compartment_ids = client.tenancy.subtree(compartment_id) if compartment_id_in_subtree else [compartment_id]
+                items = []
+                for item_compartment_id in compartment_ids:
+                    for n in range(client.tenancy.resources):
+                        ocid = "ocid1.{}.oc1.{}.{}{}{}".format(name[5:], client.region, item_compartment_id, availability_domain or "", n)
+                        items.append(FakeItem(id=ocid, display_name=name[5:] + str(n), name=name[5:] + str(n), lifecycle_state="ACTIVE",
+                                              compartment_id=item_compartment_id, time_created=Created,
+                                              defined_tags={"Oracle-Tags": {"CreatedBy": "oracleidentitycloudservice/benchmark", "CreatedOn": "2024-01-01T00:00:00.000Z"}}))
+                return Page(items, page, client.tenancy.page_size)
+            list_operation.__name__ = name
+            return list_operation
+        if name == "request_summarized_usages":
+            def usage_operation(details, page=None, **kwargs):
+                # One unit of cost per day for the first instance of every compartment, and one resource that is not listed
+                client.tenancy.call(name)
+                models = importlib.import_module("oci.usage_api.models")
+                days = (details.time_usage_ended - details.time_usage_started).days
+                items = [models.UsageSummary(resource_id="ocid1.instances.oc1.{}.{}0".format(region, compartment_id), computed_amount=float(days), currency="USD")
+                         for region in client.tenancy.regions for compartment_id in [TenancyId] + [c.id for c in client.tenancy.compartments]]
+                items.append(models.UsageSummary(resource_id="ocid1.unlisted.oc1..benchmark", computed_amount=float(days), currency="USD"))
+                return Page(items, page, client.tenancy.page_size)
+            usage_operation.__name__ = name
+            return usage_operation
+        if name == "request_summarized_configurations":
+            def configuration_operation(tenant_id, **kwargs):
+                client.tenancy.call(name)
+                return FakeResponse(FakeItem(items=[FakeItem(key="tenantId", values=[tenant_id])]))
+            configuration_operation.__name__ = name
+            return configuration_operation
+        if name.startswith("get_"):
+            def get_operation(ocid, **kwargs):
+                client.tenancy.call(name)
+                return FakeResponse(FakeItem(id=ocid, display_name=name[4:], lifecycle_state="ACTIVE", shape="VM.Standard.E4.Flex", shape_name="MySQL.2",
+                                             shape_config=FakeItem(ocpus=2.0, memory_in_gbs=16.0, processor_description="benchmark"),
+                                             size_in_gbs=50, vpus_per_gb=10, data_storage_size_in_gbs=256, cpu_core_count=2, availability_domain="BENCH:AD-1"))
+            get_operation.__name__ = name
+            return get_operation
+        raise AttributeError(name)
+
+
+##########################################################################
+# FakeSearchClient
+# Resource Search over the same synthetic resources
+##########################################################################
+class FakeSearchClient:
+
+    def __init__(self, tenancy, ServiceClient, config):
+        self.tenancy = tenancy
+        self.region = config["region"]
+        self.base_client = FakeBaseClient(ServiceClient, self.region)
+        self.results = None
+
+    def search_resources(self, search_details, page=None, **kwargs):
+        self.tenancy.call("search_resources")
+        if "resource_search.ResourceSearchClient" in self.tenancy.unavailable:
+            raise oci.exceptions.RequestException("Failed to resolve " + self.base_client.endpoint)
+        if self.results is None:
+            types = search_details.query.split("query ", 1)[1].split(" resources", 1)[0].split(", ")
+            self.results = []
+            for compartment_id in [TenancyId] + [c.id for c in self.tenancy.compartments]:
+                for resource_type in types:
+                    for n in range(self.tenancy.resources):
+                        self.results.append(FakeItem(resource_type=resource_type, identifier="ocid1.{}.oc1.{}.{}{}".format(resource_type.lower(), self.region, compartment_id, n),
+                                                     compartment_id=compartment_id, display_name=resource_type + str(n), lifecycle_state="ACTIVE",
+                                                     defined_tags={}, time_created=Created))
+        return Page(self.results, page, self.tenancy.page_size)
+
+
+##########################################################################
+# Install
+# Makes Clients.GetClient build fakes for tenancy and create_signer
+# return a config for it, instead of reading ~/.oci/config
+##########################################################################
+def Install(tenancy):
+    def factory(ServiceClient, config, signer):
+        if ServiceClient == "identity.IdentityClient":
+            return FakeIdentityClient(tenancy, ServiceClient, config)
+        if ServiceClient == "resource_search.ResourceSearchClient":
+            return FakeSearchClient(tenancy, ServiceClient, config)
+        return FakeServiceClient(tenancy, ServiceClient, config)
+
+    def create_signer(config_profile, is_instance_principals, is_delegation_token):
+        return {"tenancy": TenancyId, "user": UserId, "region": tenancy.regions[0]}, None
+
+    Clients.SetClientFactory(factory)
+    functions.create_signer = create_signer
@@ -1,9 +1,30 @@
+import datetime
+import json
+import os
 import oci
+import oci.identity
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ocimodules.Executor import DefaultWorkers
+from ocimodules.Clients import GetClient
+from ocimodules.RateLimit import Limited, GetRetryStrategy
 
 WaitRefresh = 10
 MaxIDeleteTagIteration = 5
 
+# Availability domains per (region, tenancy)
+AvailabilityDomains = {}
+ADLock = threading.Lock()
+
+DefaultCompartmentTTL = 24     # hours a cached compartment tree is used
+
+# Compartment tree cache (--compartment-cache), per "tenancy|start compartment"
+CompartmentCacheFile = ""
+CompartmentTTL = DefaultCompartmentTTL * 3600
+RefreshCompartments = False
+CompartmentCacheLock = threading.Lock()
+
 
 class OCICompartments:
     fullpath = ""
@@ -11,19 +32,26 @@ class OCICompartments:
     details = oci.identity.models.Compartment()
 
 
-def GetCompartments(identity, rootID):
+def GetCompartments(identity, rootID, subtree=False):
     retry = True
     while retry:
         retry = False
         try:
             # print("Getting compartments for {}".format(rootID))
-            compartments = oci.pagination.list_call_get_all_results(identity.list_compartments, compartment_id=rootID, retry_strategy=oci.retry.DEFAULT_RETRY_STRATEGY).data
+            if subtree:
+                # Only supported on the tenancy, returns every compartment in it
+                compartments = oci.pagination.list_call_get_all_results(Limited(identity, identity.list_compartments), compartment_id=rootID, compartment_id_in_subtree=True, access_level="ANY", retry_strategy=GetRetryStrategy()).data
+            else:
+                compartments = oci.pagination.list_call_get_all_results(Limited(identity, identity.list_compartments), compartment_id=rootID, retry_strategy=GetRetryStrategy()).data
             return compartments
         except oci.exceptions.ServiceError as e:
             if e.status == 429:
                 print("API busy.. retry", end="\r")
                 retry = True
                 time.sleep(WaitRefresh)
+            elif subtree:
+                # The caller discovers the tree level by level instead
+                raise
             else:
                 print("bad error!: " + e.message)
     return []
@@ -32,20 +60,18 @@ def GetCompartments(identity, rootID):
 #################################################
 #                 Login                 #
 #################################################
-def Login(config, signer, startcomp):
-    identity = oci.identity.IdentityClient(config, signer=signer)
+def Login(config, signer, startcomp, workers=DefaultWorkers, subtree=False):
+    identity = GetClient("identity.IdentityClient", config, signer)
     if "user" in config:
-        user = identity.get_user(config["user"]).data
+        user = Limited(identity, identity.get_user)(config["user"], retry_strategy=GetRetryStrategy()).data
         print("Logged in as: {} @ {}".format(user.description, config["region"]))
     else:
         print("Logged in as: {} @ {}".format("InstancePrinciple/DelegationToken", config["region"]))
         user = "IP-DT"
 
-    c = []
-
     # Adding Start compartment
     if "user" in config or ".tenancy." not in startcomp:
-        compartment = identity.get_compartment(compartment_id=startcomp, retry_strategy=oci.retry.DEFAULT_RETRY_STRATEGY).data
+        compartment = Limited(identity, identity.get_compartment)(compartment_id=startcomp, retry_strategy=GetRetryStrategy()).data
     else:
         # Bug fix - for working on root compartment using instance principle.
         compartment = oci.identity.models.Compartment()
@@ -61,98 +87,205 @@ def Login(config, signer, startcomp):
     else:
         newcomp.level = 0
         newcomp.fullpath = compartment.name
-    c.append(newcomp)
 
-    # Add first level subcompartments
-    compartments = GetCompartments(identity, startcomp)
+    # Add all subcompartments, either loaded with a single subtree query on the tenancy
+    # or discovered level by level (also when the subtree query is not authorized)
+    children = None
+    if subtree:
+        try:
+            children = GetSubtreeChildren(identity, config["tenancy"])
+        except oci.exceptions.ServiceError as e:
+            print("Warning: subtree query of the tenancy failed ({}-{}), discovering compartments level by level".format(e.status, e.code))
+    if children is None:
+        children, newest = CachedChildren(identity, config, startcomp)
+        if children is None:
+            children = GetCompartmentChildren(identity, startcomp, workers)
+            SaveChildren(config, startcomp, children, newest)
+    c = BuildCompartmentTree(newcomp, children)
+
+    return c
+
+
+#################################################
+#            GetCompartmentChildren
+# Breadth first discovery of the compartment tree,
+# the compartments of one level are listed in parallel
+# Returns a map of parent id to child compartments
+#################################################
+def GetCompartmentChildren(identity, startcomp, workers=DefaultWorkers):
+    children = {}
+    level = [startcomp]
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="compartments") as pool:
+        while level:
+            results = pool.map(lambda parentid: GetCompartments(identity, parentid), level)
+            nextlevel = []
+            for parentid, compartments in zip(level, results):
+                children[parentid] = compartments
+                for compartment in compartments:
+                    if compartment.lifecycle_state == "ACTIVE":
+                        nextlevel.append(compartment.id)
+            level = nextlevel
+    return children
+
+
+#################################################
+#              GetSubtreeChildren
+# Loads all compartments of the tenancy in a few paged
+# calls and returns the map of parent id to child
+# compartments from their compartment_id links.
+# Raises the ServiceError if the query is refused, e.g.
+# when the policies only cover the start compartment
+#################################################
+def GetSubtreeChildren(identity, tenancy_id):
+    children = {}
+    for compartment in GetCompartments(identity, tenancy_id, subtree=True):
+        children.setdefault(compartment.compartment_id, []).append(compartment)
+    return children
+
+
+#################################################
+#             SetCompartmentCache
+# Keeps the discovered compartment trees in cachefile
+# for ttl hours, refresh rebuilds them
+#################################################
+def SetCompartmentCache(cachefile="", ttl=DefaultCompartmentTTL, refresh=False):
+    global CompartmentCacheFile, CompartmentTTL, RefreshCompartments
+    CompartmentCacheFile = cachefile
+    CompartmentTTL = ttl * 3600
+    RefreshCompartments = refresh
+
+
+def ReadCompartmentCache():
+    if not os.path.exists(CompartmentCacheFile):
+        return {}
+    try:
+        with open(CompartmentCacheFile, encoding="utf-8") as cache:
+            return json.load(cache)
+    except ValueError:
+        return {}
 
-    # Add 2nd level subcompartments
-    fullpath = newcomp.fullpath + "/"
-    for compartment in compartments:
-        if compartment.lifecycle_state == "ACTIVE":
-            newcomp = OCICompartments()
-            newcomp.details = compartment
-            newcomp.fullpath = "{}{}".format(fullpath, compartment.name)
-            newcomp.level = 1
-            c.append(newcomp)
-            subcompartments = GetCompartments(identity, compartment.id)
-            subpath1 = compartment.name
-            for sub1 in subcompartments:
-                if sub1.lifecycle_state == "ACTIVE":
-                    newcomp = OCICompartments()
-                    newcomp.details = sub1
-                    newcomp.fullpath = "{}{}/{}".format(fullpath, subpath1, sub1.name)
-                    newcomp.level = 2
-                    c.append(newcomp)
-
-                    subcompartments2 = GetCompartments(identity, sub1.id)
-                    subpath2 = sub1.name
-                    for sub2 in subcompartments2:
-                        if sub2.lifecycle_state == "ACTIVE":
-                            newcomp = OCICompartments()
-                            newcomp.details = sub2
-                            newcomp.fullpath = "{}{}/{}/{}".format(fullpath, subpath1, subpath2, sub2.name)
-                            newcomp.level = 3
-                            c.append(newcomp)
-
-                            subcompartments3 = GetCompartments(identity, sub2.id)
-                            subpath3 = sub2.name
-                            for sub3 in subcompartments3:
-                                if sub3.lifecycle_state == "ACTIVE":
-                                    newcomp = OCICompartments()
-                                    newcomp.details = sub3
-                                    newcomp.fullpath = "{}{}/{}/{}/{}".format(fullpath, subpath1, subpath2, subpath3, sub3.name)
-                                    newcomp.level = 4
-                                    c.append(newcomp)
-
-                                    subcompartments4 = GetCompartments(identity, sub3.id)
-                                    subpath4 = sub3.name
-                                    for sub4 in subcompartments4:
-                                        if sub4.lifecycle_state == "ACTIVE":
-                                            newcomp = OCICompartments()
-                                            newcomp.details = sub4
-                                            newcomp.fullpath = "{}{}/{}/{}/{}/{}".format(fullpath, subpath1, subpath2,
-                                                                                         subpath3, subpath4, sub4.name)
-                                            newcomp.level = 5
-                                            c.append(newcomp)
-
-                                            subcompartments5 = GetCompartments(identity, sub4.id)
-                                            subpath5 = sub4.name
-                                            for sub5 in subcompartments5:
-                                                if sub5.lifecycle_state == "ACTIVE":
-                                                    newcomp = OCICompartments()
-                                                    newcomp.details = sub5
-                                                    newcomp.fullpath = "{}{}/{}/{}/{}/{}/{}".format(fullpath, subpath1, subpath2, subpath3, subpath4, subpath5, sub5.name)
-                                                    newcomp.level = 6
-                                                    c.append(newcomp)
-
-                                                    subcompartments6 = GetCompartments(identity, sub5.id)
-                                                    subpath6 = sub5.name
-                                                    for sub6 in subcompartments6:
-                                                        if sub6.lifecycle_state == "ACTIVE":
-                                                            newcomp = OCICompartments()
-                                                            newcomp.details = sub6
-                                                            newcomp.fullpath = "{}{}/{}/{}/{}/{}/{}/{}".format(
-                                                                fullpath,
-                                                                subpath1,
-                                                                subpath2,
-                                                                subpath3,
-                                                                subpath4,
-                                                                subpath5, subpath6,
-                                                                sub6.name)
-                                                            newcomp.level = 7
-                                                            c.append(newcomp)
 
+#################################################
+#              NewestCompartment
+# Id and creation time of the most recently created
+# compartment of the tenancy, in any state. A single
+# call returning one compartment, None if it fails
+#################################################
+def NewestCompartment(identity, tenancy_id):
+    try:
+        compartments = Limited(identity, identity.list_compartments)(compartment_id=tenancy_id, compartment_id_in_subtree=True, access_level="ANY",
+                                                                     sort_by="TIMECREATED", sort_order="DESC", limit=1, retry_strategy=GetRetryStrategy()).data
+    except oci.exceptions.ServiceError as e:
+        print("error {}-{} trying to check the compartment cache".format(e.code, e.message))
+        return None
+    if not compartments:
+        return ""
+    newest = compartments[0]
+    return "{}|{}".format(newest.id, newest.time_created.isoformat() if newest.time_created else "")
+
+
+#################################################
+#               CachedChildren
+# Parent map of startcomp from the cache, if younger
+# than the TTL and no compartment was created in the
+# tenancy since it was saved (the newest compartment
+# is unchanged). Renames, moves and deletions of older
+# compartments are picked up when the TTL expires or
+# with --refresh-compartments.
+# Returns the parent map (None to rebuild) and the
+# newest compartment, saved with a rebuilt tree
+#################################################
+def CachedChildren(identity, config, startcomp):
+    if not CompartmentCacheFile:
+        return None, None
+    newest = NewestCompartment(identity, config["tenancy"])
+    if RefreshCompartments or newest is None:
+        return None, newest
+    key = config["tenancy"] + "|" + startcomp
+    with CompartmentCacheLock:
+        entry = ReadCompartmentCache().get(key)
+    if entry is None or time.time() - entry.get("saved", 0) >= CompartmentTTL:
+        return None, newest
+    if entry.get("newest") != newest:
+        print("Compartments created since the tree was cached, rebuilding")
+        return None, newest
+
+    children = {}
+    for parentid, compartments in entry["children"].items():
+        children[parentid] = [oci.identity.models.Compartment(
+            id=c["id"], compartment_id=c["compartment_id"], name=c["name"], lifecycle_state=c["lifecycle_state"],
+            time_created=datetime.datetime.fromisoformat(c["time_created"]) if c["time_created"] else None) for c in compartments]
+    print("Compartment tree from cache, saved {:.1f} hours ago".format((time.time() - entry["saved"]) / 3600))
+    return children, newest
+
+
+#################################################
+#                SaveChildren
+# Writes the parent map of startcomp to the cache,
+# with the newest compartment read before the walk
+#################################################
+def SaveChildren(config, startcomp, children, newest):
+    if not CompartmentCacheFile or newest is None:
+        return
+    entry = {"saved": time.time(), "newest": newest, "children": {
+        parentid: [{"id": c.id, "compartment_id": c.compartment_id, "name": c.name, "lifecycle_state": c.lifecycle_state,
+                    "time_created": c.time_created.isoformat() if c.time_created else None} for c in compartments]
+        for parentid, compartments in children.items()}}
+    with CompartmentCacheLock:
+        entries = ReadCompartmentCache()
+        entries[config["tenancy"] + "|" + startcomp] = entry
+        with open(CompartmentCacheFile + ".tmp", "w", encoding="utf-8") as cache:
+            json.dump(entries, cache)
+        os.replace(CompartmentCacheFile + ".tmp", CompartmentCacheFile)
+
+
+#################################################
+#            BuildCompartmentTree
+# Builds the OCICompartments list (depth first, parents
+# before their subcompartments) from the parent map
+#################################################
+def BuildCompartmentTree(startcompartment, children):
+    c = []
+    stack = [startcompartment]
+    while stack:
+        parent = stack.pop()
+        c.append(parent)
+        subcompartments = []
+        for compartment in children.get(parent.details.id, []):
+            if compartment.lifecycle_state == "ACTIVE":
+                newcomp = OCICompartments()
+                newcomp.details = compartment
+                newcomp.fullpath = "{}/{}".format(parent.fullpath, compartment.name)
+                newcomp.level = parent.level + 1
+                subcompartments.append(newcomp)
+        stack.extend(reversed(subcompartments))
     return c
 
 
+#################################################
+#              ProcessCompartments
+# Active compartments to list, excluding the
+# ManagedCompartmentForPaaS (as this is locked compartment)
+# and the root compartment for root compartment objects
+#################################################
+def ProcessCompartments(compartments, tenant_id):
+    processCompartments = []
+    processRootCompartment = []
+    for compartment in compartments:
+        if compartment.details.lifecycle_state == "ACTIVE" and compartment.details.name != "ManagedCompartmentForPaaS":
+            processCompartments.append(compartment)
+        if compartment.details.id == tenant_id:
+            processRootCompartment.append(compartment)
+    return processCompartments, processRootCompartment
+
+
 #################################################
 #              SubscribedRegions
 #################################################
 def SubscribedRegions(config, signer):
     regions = []
-    identity = oci.identity.IdentityClient(config, signer=signer)
-    regionDetails = identity.list_region_subscriptions(tenancy_id=config["tenancy"]).data
+    identity = GetClient("identity.IdentityClient", config, signer)
+    regionDetails = Limited(identity, identity.list_region_subscriptions)(tenancy_id=config["tenancy"], retry_strategy=GetRetryStrategy()).data
 
     # Add subscribed regions to list
     for detail in regionDetails:
@@ -166,8 +299,8 @@ def SubscribedRegions(config, signer):
 #################################################
 def GetHomeRegion(config, signer):
     home_region = ""
-    identity = oci.identity.IdentityClient(config, signer=signer)
-    regionDetails = identity.list_region_subscriptions(tenancy_id=config["tenancy"]).data
+    identity = GetClient("identity.IdentityClient", config, signer)
+    regionDetails = Limited(identity, identity.list_region_subscriptions)(tenancy_id=config["tenancy"], retry_strategy=GetRetryStrategy()).data
 
     # Set home region for connection
     for reg in regionDetails:
@@ -177,10 +310,24 @@ def GetHomeRegion(config, signer):
     return home_region
 
 
+#################################################
+#              GetAvailabilityDomains
+# Availability domains of the region, looked up
+# once per region and shared by all listings
+#################################################
+def GetAvailabilityDomains(config, signer):
+    key = (config["region"], config["tenancy"])
+    with ADLock:
+        if key not in AvailabilityDomains:
+            identity = GetClient("identity.IdentityClient", config, signer)
+            AvailabilityDomains[key] = Limited(identity, identity.list_availability_domains)(compartment_id=config["tenancy"], retry_strategy=GetRetryStrategy()).data
+        return AvailabilityDomains[key]
+
+
 #################################################
 #              GetTenantName
 #################################################
 def GetTenantName(config, signer):
-    identity = oci.identity.IdentityClient(config, signer=signer)
-    tenancy = identity.get_tenancy(config['tenancy']).data
+    identity = GetClient("identity.IdentityClient", config, signer)
+    tenancy = Limited(identity, identity.get_tenancy)(config['tenancy'], retry_strategy=GetRetryStrategy()).data
     return tenancy.name
\ No newline at end of file
@@ -0,0 +1,145 @@
+import atexit
+import queue
+import sys
+import threading
+
+QueueSize = 10000              # pending writes before print blocks
+BufferSize = 1024 * 1024       # bytes buffered by the log file
+BatchSize = 1000               # writes joined into one write
+WaitInterval = 0.1             # seconds between checks that the writer thread is alive
+
+
+##########################################################################
+# LogWriter
+# Replaces sys.stdout: text is queued and written by a background thread
+# to the log file (and the terminal, unless quiet) in large batches.
+# The file is flushed when the queue runs empty and on flush().
+# If the log file fails the text goes to the terminal only, if the thread
+# is gone print writes to the terminal directly, so print never hangs
+##########################################################################
+class LogWriter:
+
+    def __init__(self, stdout, filename, quiet=False):
+        self.stdout = stdout
+        self.filename = filename
+        self.quiet = quiet
+        self.logfile = open(self.filename, "a", encoding="utf-8", buffering=BufferSize)
+        self.queue = queue.Queue(maxsize=QueueSize)
+        self.closed = False
+        self.failed = None
+        self.thread = threading.Thread(target=self.run, name="logwriter", daemon=True)
+        self.thread.start()
+        # Queued text is written even if the program exits without close()
+        atexit.register(self.close)
+
+    def write(self, text):
+        if self.closed or not self.put(text):
+            self.terminal(text)
+        return len(text)
+
+    def flush(self):
+        # Returns when everything written before is in the log file (and on the terminal)
+        if self.closed:
+            return
+        done = threading.Event()
+        if self.put(done):
+            while not done.wait(WaitInterval) and self.thread.is_alive():
+                pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.put(None)
+        self.thread.join()
+        self.closed = True
+        try:
+            self.logfile.close()
+        except (OSError, ValueError):
+            pass
+
+    def put(self, item):
+        # Queues item, False if the writer thread is gone
+        while self.thread.is_alive():
+            try:
+                self.queue.put(item, timeout=WaitInterval)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def terminal(self, text):
+        try:
+            self.stdout.write(text)
+        except (OSError, ValueError):
+            pass
+
+    def fail(self, error):
+        if self.failed is None:
+            self.failed = error
+            try:
+                sys.__stderr__.write("\nWriting to {} failed ({}), output goes to the terminal only\n".format(self.filename, error))
+            except (OSError, ValueError, AttributeError):
+                pass
+
+    def output(self, text):
+        if text:
+            if self.failed is None:
+                try:
+                    self.logfile.write(text)
+                except (OSError, ValueError) as e:
+                    self.fail(e)
+            if not self.quiet or self.failed is not None:
+                self.terminal(text)
+
+    def sync(self):
+        if self.failed is None:
+            try:
+                self.logfile.flush()
+            except (OSError, ValueError) as e:
+                self.fail(e)
+        try:
+            self.stdout.flush()
+        except (OSError, ValueError):
+            pass
+
+    def run(self):
+        try:
+            while True:
+                items = [self.queue.get()]
+                try:
+                    while len(items) < BatchSize:
+                        items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    pass
+
+                text = []
+                for item in items:
+                    if isinstance(item, str):
+                        text.append(item)
+                        continue
+                    self.output("".join(text))
+                    text = []
+                    self.sync()
+                    if item is None:
+                        return
+                    item.set()
+                self.output("".join(text))
+
+                if self.queue.empty():
+                    self.sync()
+        except Exception as e:
+            # The thread ends, write() and flush() see it is gone and write to the terminal
+            self.fail(e)
+            self.drain()
+
+    def drain(self):
+        # Text still queued goes to the terminal, waiting flush() calls are released
+        try:
+            while True:
+                item = self.queue.get_nowait()
+                if isinstance(item, str):
+                    self.terminal(item)
+                elif item is not None:
+                    item.set()
+        except queue.Empty:
+            pass
@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+import time
+
+# Metrics of all API calls, per (region, service, compartment)
+Metrics = {}
+MetricsLock = threading.Lock()
+RunStart = time.time()
+
+Counters = ["calls", "pages", "retries", "throttles", "errors", "seconds"]
+
+
+##########################################################################
+# CallMetrics
+# Counters of one (region, service, compartment). A call is one logical
+# API call (all its pages), a page one successful request, retries and
+# throttles are the extra requests of throttled pages
+##########################################################################
+class CallMetrics:
+    __slots__ = Counters
+
+    def __init__(self):
+        self.calls = 0
+        self.pages = 0
+        self.retries = 0
+        self.throttles = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def add(self, other):
+        for counter in Counters:
+            setattr(self, counter, getattr(self, counter) + getattr(other, counter))
+
+
+##########################################################################
+# Observe
+# Records one request (a page) of an API call
+##########################################################################
+def Observe(region, service, compartment, first_page, attempts, throttles, error, seconds):
+    key = (region or "", service, compartment or "")
+    with MetricsLock:
+        metrics = Metrics.get(key)
+        if metrics is None:
+            metrics = Metrics[key] = CallMetrics()
+        if first_page:
+            metrics.calls += 1
+        if error is None:
+            metrics.pages += 1
+        else:
+            metrics.errors += 1
+        metrics.retries += max(0, attempts - 1)
+        metrics.throttles += throttles
+        metrics.seconds += seconds
+
+
+##########################################################################
+# Totals
+# Sums the metrics per group of the (region, service, compartment) key
+##########################################################################
+def Totals(group=lambda key: ()):
+    totals = {}
+    with MetricsLock:
+        for key, metrics in Metrics.items():
+            total = totals.get(group(key))
+            if total is None:
+                total = totals[group(key)] = CallMetrics()
+            total.add(metrics)
+    return totals
+
+
+def AsDict(metrics):
+    result = {counter: getattr(metrics, counter) for counter in Counters}
+    result["seconds"] = round(metrics.seconds, 3)
+    return result
+
+
+##########################################################################
+# WriteJson
+# Writes the totals of the run, per region, per service and per
+# (region, service, compartment) to filename
+##########################################################################
+def WriteJson(filename, run=None):
+    run = run or {}
+    total = Totals().get((), CallMetrics())
+    result = {
+        "run": dict(run, start=time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(RunStart)), seconds=round(time.time() - RunStart, 3)),
+        "totals": AsDict(total),
+        "regions": {region: AsDict(m) for (region,), m in sorted(Totals(lambda key: (key[0],)).items())},
+        "services": {service: AsDict(m) for (service,), m in sorted(Totals(lambda key: (key[1],)).items())},
+        "calls": [dict(region=key[0], service=key[1], compartment=key[2], **AsDict(m)) for key, m in sorted(Totals(lambda key: key).items())]
+    }
+    with open(filename, "w", encoding="utf-8") as jsonfile:
+        json.dump(result, jsonfile, indent=1)
+
+
+##########################################################################
+# WritePrometheus
+# Writes the totals per (region, service) as a Prometheus textfile, for
+# the node_exporter textfile collector. Compartments are left out to keep
+# the number of series small, they are in the json file
+##########################################################################
+def WritePrometheus(filename, run=None):
+    run = run or {}
+    lines = []
+    descriptions = {
+        "calls": ("superlist_api_calls_total", "counter", "API calls, all pages of a list call count as one"),
+        "pages": ("superlist_api_pages_total", "counter", "Successful API requests (pages)"),
+        "retries": ("superlist_api_retries_total", "counter", "Requests retried after a throttle"),
+        "throttles": ("superlist_api_throttles_total", "counter", "Requests throttled (429)"),
+        "errors": ("superlist_api_errors_total", "counter", "API calls failed with an error"),
+        "seconds": ("superlist_api_seconds_total", "counter", "Seconds spent in API calls, including rate limit waits"),
+    }
+    totals = sorted(Totals(lambda key: (key[0], key[1])).items())
+    for counter in Counters:
+        name, kind, description = descriptions[counter]
+        lines.append("# HELP {} {}".format(name, description))
+        lines.append("# TYPE {} {}".format(name, kind))
+        for (region, service), metrics in totals:
+            lines.append('{}{{region="{}",service="{}"}} {}'.format(name, region, service, round(getattr(metrics, counter), 3)))
+    lines.append("# HELP superlist_run_seconds Duration of the last run")
+    lines.append("# TYPE superlist_run_seconds gauge")
+    lines.append("superlist_run_seconds {}".format(round(time.time() - RunStart, 3)))
+    lines.append("# HELP superlist_run_timestamp_seconds End time of the last run")
+    lines.append("# TYPE superlist_run_timestamp_seconds gauge")
+    lines.append("superlist_run_timestamp_seconds {}".format(int(time.time())))
+    for name, value in sorted(run.items()):
+        if isinstance(value, (int, float)):
+            lines.append("# TYPE superlist_run_{} gauge".format(name))
+            lines.append("superlist_run_{} {}".format(name, value))
+
+    # Written to a temporary file and renamed, so the collector never reads a partial file
+    with open(filename + ".tmp", "w", encoding="utf-8") as promfile:
+        promfile.write("\n".join(lines) + "\n")
+    os.replace(filename + ".tmp", filename)
+
+
+##########################################################################
+# PrintSummary
+# Prints where the time went, the slowest (region, service) pairs
+##########################################################################
+def PrintSummary(top=5):
+    totals = Totals(lambda key: (key[0], key[1]))
+    for (region, service), metrics in sorted(totals.items(), key=lambda item: -item[1].seconds)[:top]:
+        print("  {} {} : {} calls, {} pages, {:.1f}s, {} errors".format(region, service, metrics.calls, metrics.pages, metrics.seconds, metrics.errors))
@@ -0,0 +1,241 @@
+import oci
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from ocimodules.Executor import DefaultEndpointWorkers
+from ocimodules.Clients import ClientRegion
+from ocimodules import Metrics
+
+DefaultRate = 0        # max calls per second per service endpoint, 0 means no ceiling
+MaxRetries = 8         # retries of a throttled (429) call
+MaxBackoff = 60        # seconds
+
+# Same as the SDK default retry strategy, but throttles (429) are not retried by the SDK.
+# They are returned to the RateController which slows down the whole endpoint instead.
+ThrottleRetryStrategy = oci.retry.RetryStrategyBuilder().add_max_attempts(max_attempts=8) \
+    .add_total_elapsed_time(total_elapsed_time_seconds=600) \
+    .add_service_error_check(service_error_retry_config={-1: [], 409: ['IncorrectState', 'LockConflict']},
+                             service_error_retry_on_any_5xx=True) \
+    .get_retry_strategy()
+
+# RateController shared by all API calls, None means no rate limiting
+Controller = None
+
+
+##########################################################################
+# EndpointLimiter
+# Token bucket and AIMD concurrency limit for one service endpoint.
+# A throttle halves rate and concurrency, every successful call adds a
+# little back until the configured maximum is reached again.
+# Without a maximum rate (0) calls are not rate limited until the first
+# throttle, which starts the bucket at half the rate seen in the last second
+##########################################################################
+class EndpointLimiter:
+
+    def __init__(self, rate, max_concurrency):
+        self.max_rate = rate or None
+        self.rate = self.max_rate
+        self.tokens = max(1.0, (self.rate or 0) * 2)
+        self.updated = time.monotonic()
+        # Calls started in the current and in the last second, for the first throttle
+        self.window_start = self.updated
+        self.window_calls = 0
+        self.observed = 0.0
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.inflight = 0
+        self.calls = 0
+        self.throttles = 0
+        self.wait_seconds = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        start = time.monotonic()
+        with self.cond:
+            while self.inflight >= int(self.limit):
+                self.cond.wait()
+            self.inflight += 1
+            self.calls += 1
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.observed = self.window_calls / (now - self.window_start)
+                self.window_start = now
+                self.window_calls = 0
+            self.window_calls += 1
+            if self.rate is None:
+                self.wait_seconds += now - start
+                return
+        while True:
+            with self.cond:
+                now = time.monotonic()
+                self.tokens = min(max(1.0, self.rate * 2), self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.wait_seconds += time.monotonic() - start
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def release(self, throttled=False):
+        with self.cond:
+            self.inflight -= 1
+            if throttled:
+                self.throttles += 1
+                self.limit = max(1.0, self.limit / 2)
+                if self.rate is None:
+                    self.rate = max(self.observed, self.window_calls / max(1.0, time.monotonic() - self.window_start))
+                    self.tokens = 0.0
+                    self.updated = time.monotonic()
+                self.rate = max(0.5, self.rate / 2)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+                if self.rate is not None:
+                    self.rate = min(self.max_rate or float("inf"), self.rate + 1.0 / self.rate)
+            self.cond.notify_all()
+
+    def backoff(self, seconds):
+        with self.cond:
+            self.wait_seconds += seconds
+        time.sleep(seconds)
+
+
+##########################################################################
+# RateController
+# Runs API calls through the limiter of their endpoint and retries
+# throttled calls after Retry-After (or an exponential backoff)
+##########################################################################
+class RateController:
+
+    def __init__(self, rate=DefaultRate, max_concurrency=DefaultEndpointWorkers):
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def limiter(self, endpoint):
+        with self.lock:
+            if endpoint not in self.limiters:
+                self.limiters[endpoint] = EndpointLimiter(self.rate, self.max_concurrency)
+            return self.limiters[endpoint]
+
+    def call(self, endpoint, operation, *args, **kwargs):
+        limiter = self.limiter(endpoint)
+        attempt = 0
+        while True:
+            limiter.acquire()
+            try:
+                result = operation(*args, **kwargs)
+            except oci.exceptions.ServiceError as e:
+                if e.status != 429:
+                    limiter.release()
+                    raise
+                limiter.release(throttled=True)
+                attempt += 1
+                if attempt > MaxRetries:
+                    raise
+                delay = RetryAfter(e.headers)
+                if delay is None:
+                    delay = min(MaxBackoff, 2 ** attempt) * random.uniform(0.5, 1.0)
+                limiter.backoff(delay)
+                continue
+            except Exception:
+                limiter.release()
+                raise
+            limiter.release()
+            return result
+
+    def stats(self):
+        with self.lock:
+            limiters = dict(self.limiters)
+        return {endpoint: {"calls": l.calls, "throttles": l.throttles, "wait_seconds": round(l.wait_seconds, 2)} for endpoint, l in limiters.items()}
+
+
+##########################################################################
+# RetryAfter
+# Seconds to wait from the Retry-After header (seconds or HTTP date)
+##########################################################################
+def RetryAfter(headers):
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def SetController(controller):
+    global Controller
+    Controller = controller
+
+
+def Endpoint(client):
+    return getattr(client.base_client, "endpoint", None) or type(client).__name__
+
+
+##########################################################################
+# Limited
+# Returns the operation of client, running through the shared controller
+# and instrumented in Metrics. Can be passed to oci.pagination, so every
+# page is rate limited and counted
+##########################################################################
+def Limited(client, operation):
+    controller = Controller
+    endpoint = Endpoint(client)
+    region = ClientRegion(client)
+    service = type(client).__name__ + "." + getattr(operation, "__name__", "call")
+
+    def call(*args, **kwargs):
+        attempts = [0, 0]
+
+        def attempt(*args, **kwargs):
+            attempts[0] += 1
+            try:
+                return operation(*args, **kwargs)
+            except oci.exceptions.ServiceError as e:
+                if e.status == 429:
+                    attempts[1] += 1
+                raise
+
+        start = time.perf_counter()
+        error = None
+        try:
+            if controller is None:
+                return attempt(*args, **kwargs)
+            return controller.call(endpoint, attempt, *args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # oci.pagination passes page only for the pages after the first
+            Metrics.Observe(region, service, kwargs.get("compartment_id"), kwargs.get("page") is None, attempts[0], attempts[1], error, time.perf_counter() - start)
+    return call
+
+
+def GetRetryStrategy():
+    # With a controller, throttles are handled by the controller instead of the SDK
+    return ThrottleRetryStrategy if Controller is not None else oci.retry.DEFAULT_RETRY_STRATEGY
+
+
+##########################################################################
+# PrintStats
+# Prints throttles and time waited per endpoint
+##########################################################################
+def PrintStats():
+    if Controller is None:
+        return
+    stats = Controller.stats()
+    print("API calls            : " + str(sum(s["calls"] for s in stats.values())))
+    print("Throttled (429)      : " + str(sum(s["throttles"] for s in stats.values())))
+    print("Rate limit waits     : {:.1f}s".format(sum(s["wait_seconds"] for s in stats.values())))
+    for endpoint, s in sorted(stats.items()):
+        if s["throttles"]:
+            print("  {} : {} throttles, {:.1f}s waited".format(endpoint, s["throttles"], s["wait_seconds"]))
@@ -0,0 +1,344 @@
+import contextvars
+import csv
+import datetime
+import json
+import os
+import sqlite3
+import threading
+from ocimodules import Cost
+
+CSV_HEADER = ['Service', 'Region', 'Compartment', 'display_name', 'lifecycle_state', 'id', 'compartment_id', 'created_by', 'created_on', 'EOL', 'LifeTime', 'time_created', 'parent_compartment', 'assigned_to', 'Action', 'Justification', 'Tenancy', 'Details', 'Cost']
+
+# Columns of the jsonl and parquet files, the csv columns that are filled by list.py
+TYPED_HEADER = CSV_HEADER[:13] + ['Tenancy', 'Details', 'Cost']
+DATE_COLUMNS = ['created_on', 'time_created']
+FLOAT_COLUMNS = ['Cost']
+ParquetRowGroupSize = 100000
+SqliteBatchSize = 10000
+SQLITE_INDEXES = ['id', 'Compartment', 'Service', 'created_by', 'Region', 'compartment_id', 'Tenancy']
+
+# Serializes output so records of concurrent work units are not interleaved
+OutputLock = threading.RLock()
+
+# Sinks receiving every record of the current run (context), set per tenancy in batch mode
+Sinks = contextvars.ContextVar("Sinks", default=None)
+RecordCount = 0
+
+
+def SafePrint(*args, **kwargs):
+    with OutputLock:
+        print(*args, **kwargs)
+
+
+##########################################################################
+# BuildRecord
+# Returns the record (field name -> value) for one listed item
+##########################################################################
+def BuildRecord(config, item, ServiceName, compartment_name, ObjectNameVar="display_name"):
+    record = {}
+    record['Service'] = ServiceName
+    # todo add category
+    record['Region'] = config["region"]
+    record['Compartment'] = compartment_name
+    if hasattr(item, ObjectNameVar):
+        record[ObjectNameVar] = getattr(item, ObjectNameVar)
+    if hasattr(item, "lifecycle_state"):
+        record['lifecycle_state'] = item.lifecycle_state
+    if hasattr(item, "id"):
+        record['id'] = item.id
+    if hasattr(item, "compartment_id"):
+        record['compartment_id'] = item.compartment_id
+    # Extract tags (with placeholders for missing values)
+    defined_tags = item.defined_tags if hasattr(item, "defined_tags") and item.defined_tags is not None else {}
+    oracle_tags = defined_tags.get("Oracle-Tags", {}) if defined_tags else {}
+    created_by_value = oracle_tags.get("CreatedBy", "MISSING")
+    if created_by_value != "MISSING" and "/" in created_by_value:
+        created_by_value = created_by_value.split("/")[-1]
+    record['created_by'] = created_by_value
+    record['created_on'] = oracle_tags.get("CreatedOn", "MISSING").split("T")[0] if oracle_tags.get("CreatedOn", "MISSING") != "MISSING" else "MISSING"
+    record['EOL'] = oracle_tags.get("EOL", "MISSING")
+    record['LifeTime'] = oracle_tags.get("LifeTime", "MISSING")
+    # Extract time_created
+    if hasattr(item, "time_created") and item.time_created is not None:
+        record['time_created'] = item.time_created.strftime("%Y-%m-%d")  # Format the date
+    else:
+        record['time_created'] = "MISSING"
+    # Tenancy name, so outputs of several tenancies can be merged
+    record['Tenancy'] = config.get("tenancy_name", "N/A")
+    # Cost in the --cost-days window, joined from the Usage API
+    cost = Cost.ResourceCost(config.get("tenancy"), record.get('id'))
+    if cost is not None:
+        record['Cost'] = cost
+    return record
+
+
+##########################################################################
+# FormatRecord
+# Returns the human readable text block of a record, as written to the log
+##########################################################################
+def FormatRecord(record):
+    lines = ["----------------------------------------------------"]
+    for key, value in record.items():
+        lines.append(f'{key}: {value}')
+    lines.append("----------------------------------------------------")
+    return "\n".join(lines)
+
+
+##########################################################################
+# RecordToRow
+# Returns the CSV row of a record, N/A for values that are not found
+##########################################################################
+def RecordToRow(record):
+    compartment = record.get('Compartment', 'N/A')
+    parent_compartment = compartment.split('/')[2] if compartment.startswith('/root/') and len(compartment.split('/')) > 2 else 'N/A'
+    row = [record.get(key, 'N/A') for key in CSV_HEADER[:12]]
+    row.append(parent_compartment)
+    # assigned_to, Action and Justification are filled in by hand
+    row.extend(['', '', ''])
+    row.append(record.get('Tenancy', 'N/A'))
+    # name=value pairs of --detail
+    row.append(record.get('Details', 'N/A'))
+    row.append(record.get('Cost', 'N/A'))
+    return row
+
+
+##########################################################################
+# CsvSink
+# Writes every record as a CSV row as it arrives
+##########################################################################
+class CsvSink:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.csvfile = open(self.filename, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.csvfile)
+        self.writer.writerow(CSV_HEADER)
+        self.rows = 0
+
+    def write(self, record):
+        self.writer.writerow(RecordToRow(record))
+        self.rows += 1
+
+    def close(self):
+        self.csvfile.close()
+
+
+##########################################################################
+# TypedRow
+# Returns the record as TYPED_HEADER column -> value, with None for values
+# that are not found (N/A, MISSING), dates as datetime.date and costs
+# as float
+##########################################################################
+def TypedRow(record):
+    row = {}
+    values = dict(zip(CSV_HEADER, RecordToRow(record)))
+    for key in TYPED_HEADER:
+        value = values[key]
+        if value in ('N/A', 'MISSING'):
+            value = None
+        elif key in DATE_COLUMNS:
+            try:
+                value = datetime.date.fromisoformat(value)
+            except (TypeError, ValueError):
+                value = None
+        elif key in FLOAT_COLUMNS:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                value = None
+        row[key] = value
+    return row
+
+
+##########################################################################
+# JsonlSink
+# Writes every record as one json object per line, dates as YYYY-MM-DD
+# and null for values that are not found
+##########################################################################
+class JsonlSink:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.jsonfile = open(self.filename, "w", encoding="utf-8")
+
+    def write(self, record):
+        row = TypedRow(record)
+        for key in DATE_COLUMNS:
+            if row[key] is not None:
+                row[key] = row[key].isoformat()
+        self.jsonfile.write(json.dumps(row) + "\n")
+
+    def close(self):
+        self.jsonfile.close()
+
+
+def ParquetAvailable():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+##########################################################################
+# ParquetSink
+# Writes the records to a parquet file (needs pyarrow), buffered and
+# written one row group at a time. Dates are date32 columns, costs float64
+##########################################################################
+class ParquetSink:
+
+    def __init__(self, filename, row_group_size=ParquetRowGroupSize):
+        import pyarrow
+        import pyarrow.parquet
+        self.pyarrow = pyarrow
+        self.filename = filename
+        self.row_group_size = row_group_size
+        self.schema = pyarrow.schema([(key, pyarrow.date32() if key in DATE_COLUMNS else pyarrow.float64() if key in FLOAT_COLUMNS else pyarrow.string()) for key in TYPED_HEADER])
+        self.writer = pyarrow.parquet.ParquetWriter(self.filename, self.schema)
+        self.columns = {key: [] for key in TYPED_HEADER}
+        self.rows = 0
+
+    def write(self, record):
+        for key, value in TypedRow(record).items():
+            self.columns[key].append(value)
+        self.rows += 1
+        if self.rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(self.pyarrow.Table.from_pydict(self.columns, schema=self.schema))
+            self.columns = {key: [] for key in TYPED_HEADER}
+            self.rows = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+##########################################################################
+# SqliteSink
+# Writes the records to the resources table of a SQLite database, in
+# batches of SqliteBatchSize rows per transaction. The indexes are built
+# at close, after the bulk load. The compartment tree is written to the
+# compartments table, so resources can be queried per subtree, e.g.
+#   select r.* from resources r join compartments c on r.compartment_id = c.id
+#   where c.fullpath like '/root/prod%' and r.created_by = 'someone'
+##########################################################################
+class SqliteSink:
+
+    def __init__(self, filename, batch_size=SqliteBatchSize):
+        self.filename = filename
+        self.batch_size = batch_size
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        # Records of all worker threads are written under OutputLock
+        self.db = sqlite3.connect(self.filename, check_same_thread=False)
+        self.db.execute("create table resources ({})".format(", ".join('"{}" {}'.format(key, "real" if key in FLOAT_COLUMNS else "text") for key in TYPED_HEADER)))
+        self.db.execute("create table compartments (id text primary key, parent_id text, name text, fullpath text, level integer, lifecycle_state text, time_created text)")
+        self.rows = []
+
+    def write(self, record):
+        row = TypedRow(record)
+        self.rows.append([value.isoformat() if isinstance(value, datetime.date) else value for value in row.values()])
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            with self.db:
+                self.db.executemany("insert into resources values ({})".format(", ".join("?" * len(TYPED_HEADER))), self.rows)
+            self.rows = []
+
+    def write_compartments(self, compartments):
+        # compartments are the OCICompartments of IAM.Login
+        with OutputLock, self.db:
+            self.db.executemany("insert or replace into compartments values (?, ?, ?, ?, ?, ?, ?)",
+                                [(c.details.id, c.details.compartment_id, c.details.name, c.fullpath, c.level, c.details.lifecycle_state,
+                                  c.details.time_created.isoformat() if c.details.time_created else None) for c in compartments])
+
+    def close(self):
+        self.flush()
+        with self.db:
+            for key in SQLITE_INDEXES:
+                self.db.execute('create index if not exists "resources_{0}" on resources ("{0}")'.format(key))
+            self.db.execute("create index if not exists compartments_fullpath on compartments (fullpath)")
+            self.db.execute("create index if not exists compartments_parent_id on compartments (parent_id)")
+        self.db.close()
+
+
+##########################################################################
+# LogSink
+# Prints every record as a text block to the (tee'd) log
+##########################################################################
+class LogSink:
+
+    # Records of a resumed run are already in the (appended) log
+    replay = False
+
+    def write(self, record):
+        print(FormatRecord(record))
+
+    def close(self):
+        pass
+
+
+##########################################################################
+# OpenSinks
+# Sinks of a run writing to logfile + extension, for the --format formats
+##########################################################################
+def OpenSinks(logfile, formats, compartments, log_records=True):
+    AddSink(CsvSink(logfile + ".csv"))
+    if "jsonl" in formats:
+        AddSink(JsonlSink(logfile + ".jsonl"))
+    if "parquet" in formats:
+        AddSink(ParquetSink(logfile + ".parquet"))
+    if "sqlite" in formats:
+        sqlite_sink = SqliteSink(logfile + ".sqlite")
+        sqlite_sink.write_compartments(compartments)
+        AddSink(sqlite_sink)
+    if log_records:
+        AddSink(LogSink())
+
+
+##########################################################################
+# AddSink / EmitRecord / CloseSinks
+# Work on the sinks of the current context. Work units submitted to the
+# executor run in a copy of the context of the run that submitted them
+##########################################################################
+def CurrentSinks():
+    sinks = Sinks.get()
+    if sinks is None:
+        sinks = []
+        Sinks.set(sinks)
+    return sinks
+
+
+def AddSink(sink):
+    with OutputLock:
+        CurrentSinks().append(sink)
+
+
+def EmitRecord(record):
+    global RecordCount
+    with OutputLock:
+        RecordCount += 1
+        for sink in CurrentSinks():
+            sink.write(record)
+
+
+def ReplayRecords(records):
+    # Rewrites records of a previous (resumed) run to the sinks that were recreated
+    with OutputLock:
+        for record in records:
+            for sink in CurrentSinks():
+                if getattr(sink, "replay", True):
+                    sink.write(record)
+
+
+def CloseSinks():
+    with OutputLock:
+        sinks = CurrentSinks()
+        for sink in sinks:
+            sink.close()
+        sinks.clear()
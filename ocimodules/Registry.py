@@ -0,0 +1,262 @@
+from ocimodules.AnyList import ListAny
+from ocimodules.IAM import GetAvailabilityDomains
+from ocimodules.Search import SearchSupported, PlanSearch, DropSearch
+from ocimodules.Capabilities import ProbePlan, CachedPlan
+from ocimodules.Executor import GetExecutor, DefaultWorkers
+from ocimodules.functions import print_header, CurrentTimeString
+
+##########################################################################
+# Service registry
+# One entry per object type: (category, ServiceClient, ServiceName, ListAny options, top5)
+# The category is what is selected with -o, top5 entries are listed with --top5
+# Subtree marks list operations supporting compartment_id_in_subtree, listed with one
+# call on the start compartment. True, or the access_level the operation needs
+##########################################################################
+Services = [
+    ("compute", "core.ComputeClient", "instance", {}, True),
+    # ("compute", "core.ComputeClient", "image", {}, False),
+    # ("compute", "core.ComputeClient", "dedicated_vm_host", {}, False),
+    # ("compute", "core.ComputeManagementClient", "instance_pool", {}, False),
+    # ("compute", "core.ComputeManagementClient", "instance_configuration", {}, False),
+    # ("compute", "autoscaling.AutoScalingClient", "auto_scaling_configuration", {}, False),
+    # ("compute", "os_management.OsManagementClient", "managed_instance_group", {}, False),
+    # ("compute", "os_management.OsManagementClient", "scheduled_job", {}, False),
+    # ("compute", "os_management.OsManagementClient", "software_source", {}, False),
+    # ("compute", "management_agent.ManagementAgentClient", "management_agent", {}, False),
+    ("vbinstance", "visual_builder.VbInstanceClient", "vb_instance", {}, True),
+    ("dataintegration", "data_integration.DataIntegrationClient", "workspace", {}, False),
+    ("database", "database.DatabaseClient", "db_system", {}, True),
+    ("database", "database.DatabaseClient", "autonomous_database", {}, True),
+    # ("database", "database.DatabaseClient", "backup", {}, False),
+    ("database", "mysql.DbSystemClient", "db_system", {}, True),
+    ("database", "nosql.NosqlClient", "table", {"ServiceID": "table_name_or_id"}, True),
+    ("oda", "oda.OdaClient", "oda_instance", {}, True),
+    ("analytics", "analytics.AnalyticsClient", "analytics_instance", {"ObjectNameVar": "name"}, True),
+    # ("analytics", "streaming.StreamAdminClient", "stream", {"ObjectNameVar": "name"}, False),
+    # ("analytics", "streaming.StreamAdminClient", "stream_pool", {"ObjectNameVar": "name"}, False),
+    # ("analytics", "streaming.StreamAdminClient", "connect_harness", {"ObjectNameVar": "name"}, False),
+    # ("analytics", "sch.ServiceConnectorClient", "service_connector", {}, False),
+    ("integration", "integration.IntegrationInstanceClient", "integration_instance", {}, False),
+    ("devops", "devops.DevopsClient", "deploy_stage", {}, False),
+    ("devops", "devops.DevopsClient", "deploy_artifact", {}, False),
+    ("devops", "devops.DevopsClient", "deploy_environment", {}, False),
+    ("devops", "devops.DevopsClient", "deploy_pipeline", {}, False),
+    ("devops", "devops.DevopsClient", "build_pipeline", {}, False),
+    ("devops", "devops.DevopsClient", "repository", {"ObjectNameVar": "name"}, False),
+    ("devops", "devops.DevopsClient", "project", {"ObjectNameVar": "name"}, False),
+    ("ocvs", "ocvp.SddcClient", "sddc", {}, True),
+    ("dbmigration", "database_migration.DatabaseMigrationClient", "migration", {}, False),
+    ("dbmigration", "database_migration.DatabaseMigrationClient", "connection", {}, False),
+    ("migration", "cloud_migrations.MigrationClient", "migration_plan", {}, False),
+    ("migration", "cloud_migrations.MigrationClient", "migration", {}, False),
+    ("migration", "cloud_migrations.MigrationClient", "replication_schedule", {}, False),
+    ("migration", "cloud_bridge.OcbAgentSvcClient", "environment", {}, False),
+    ("migration", "cloud_bridge.OcbAgentSvcClient", "agent_dependency", {}, False),
+    ("migration", "cloud_bridge.DiscoveryClient", "asset_source", {}, False),
+    ("migration", "cloud_bridge.DiscoveryClient", "discovery_schedule", {}, False),
+    ("migration", "cloud_bridge.InventoryClient", "asset", {}, False),
+    ("migration", "cloud_bridge.InventoryClient", "inventory", {}, False),
+    ("goldengate", "golden_gate.GoldenGateClient", "database_registration", {}, False),
+    ("goldengate", "golden_gate.GoldenGateClient", "deployment", {}, False),
+    ("goldengate", "golden_gate.GoldenGateClient", "deployment_backup", {}, False),
+    ("bastion", "bastion.BastionClient", "bastion", {"ObjectNameVar": "name"}, False),
+    ("waf", "waf.WafClient", "web_app_firewall", {}, False),
+    # ("waf", "waf.WafClient", "web_app_firewall_policy", {}, False),
+    ("cloudguard", "cloud_guard.CloudGuardClient", "target", {"Subtree": "ACCESSIBLE"}, False),
+    ("cloudguard", "cloud_guard.CloudGuardClient", "detector_recipe", {"Subtree": "ACCESSIBLE"}, False),
+    ("cloudguard", "cloud_guard.CloudGuardClient", "responder_recipe", {"Subtree": "ACCESSIBLE"}, False),
+    ("cloudguard", "cloud_guard.CloudGuardClient", "managed_list", {"Subtree": "ACCESSIBLE"}, False),
+    # ("email", "email.EmailClient", "sender", {"ObjectNameVar": "email_address"}, False),
+    # ("email", "email.EmailClient", "email_domain", {"ObjectNameVar": "name"}, False),
+    ("oke", "container_engine.ContainerEngineClient", "cluster", {"ObjectNameVar": "name"}, False),
+    ("ocir", "artifacts.ArtifactsClient", "container_repository", {"ServiceID": "repository_id", "Subtree": True}, False),
+    ("ocir", "artifacts.ArtifactsClient", "repository", {}, False),
+    # ("datascience", "data_science.DataScienceClient", "notebook_session", {}, False),
+    ("datascience", "data_science.DataScienceClient", "model_deployment", {}, False),
+    ("datascience", "data_science.DataScienceClient", "model", {}, False),
+    ("datascience", "data_science.DataScienceClient", "project", {}, False),
+    ("apigateway", "apigateway.DeploymentClient", "deployment", {}, False),
+    ("apigateway", "apigateway.GatewayClient", "gateway", {}, False),
+    ("apigateway", "apigateway.ApiGatewayClient", "api", {}, False),
+    ("apigateway", "apigateway.ApiGatewayClient", "certificate", {}, False),
+    # ("datasafe", "data_safe.DataSafeClient", "user_assessment", {}, False),
+    # ("datasafe", "data_safe.DataSafeClient", "security_assessment", {}, False),
+    ("datasafe", "data_safe.DataSafeClient", "target_database", {"Subtree": "ACCESSIBLE"}, False),
+    ("datasafe", "data_safe.DataSafeClient", "on_prem_connector", {"Subtree": "ACCESSIBLE"}, False),
+    ("datasafe", "data_safe.DataSafeClient", "data_safe_private_endpoint", {"Subtree": "ACCESSIBLE"}, False),
+    # ("dbmanagement", "database_management.DbManagementClient", "db_management_private_endpoint", {"ObjectNameVar": "name"}, False),
+    # ("dbmanagement", "database_management.DbManagementClient", "managed_database_group", {"ObjectNameVar": "name"}, False),
+    ("datacatalog", "data_catalog.DataCatalogClient", "catalog", {}, False),
+    ("datacatalog", "data_catalog.DataCatalogClient", "catalog_private_endpoint", {}, False),
+    ("datacatalog", "data_catalog.DataCatalogClient", "metastore", {}, False),
+    ("blockchain", "blockchain.BlockchainPlatformClient", "blockchain_platform", {}, False),
+    ("rm", "resource_manager.ResourceManagerClient", "stack", {}, False),
+    ("rm", "resource_manager.ResourceManagerClient", "configuration_source_provider", {}, False),
+    # ("anomaly", "ai_anomaly_detection.AnomalyDetectionClient", "data_asset", {}, False),
+    # ("anomaly", "ai_anomaly_detection.AnomalyDetectionClient", "model", {}, False),
+    # ("anomaly", "ai_anomaly_detection.AnomalyDetectionClient", "project", {}, False),
+    ("dataflow", "data_flow.DataFlowClient", "private_endpoint", {}, False),
+    ("dataflow", "data_flow.DataFlowClient", "application", {}, False),
+    ("dataflow", "data_flow.DataFlowClient", "run", {}, False),
+    # ("block", "core.BlockstorageClient", "volume_group", {}, False),
+    # ("block", "core.BlockstorageClient", "volume_group_backup", {}, False),
+    ("block", "core.BlockstorageClient", "volume", {}, True),
+    ("block", "core.BlockstorageClient", "volume_backup", {}, True),
+    ("block", "core.BlockstorageClient", "boot_volume", {}, True),
+    ("block", "core.BlockstorageClient", "boot_volume_backup", {}, True),
+    # ("fss", "file_storage.FileStorageClient", "mount_target", {"PerAD": True}, True),
+    ("fss", "file_storage.FileStorageClient", "file_system", {"PerAD": True}, True),
+    ("network", "core.VirtualNetworkClient", "local_peering_gateway", {}, False),
+    ("network", "core.VirtualNetworkClient", "remote_peering_connection", {}, False),
+    ("network", "core.VirtualNetworkClient", "drg", {}, False),
+    ("observability", "monitoring.MonitoringClient", "alarm", {"Subtree": True}, False),
+    ("observability", "ons.NotificationControlPlaneClient", "topic", {"ObjectNameVar": "name", "ServiceID": "topic_id", "ReturnServiceID": "topic_id"}, False),
+    ("observability", "events.EventsClient", "rule", {}, False),
+    ("iam", "identity.IdentityClient", "policy", {"ObjectNameVar": "name"}, False),
+    ("iam", "identity.IdentityClient", "dynamic_group", {"ObjectNameVar": "name"}, False),
+]
+
+# Header printed before listing a category
+Categories = {
+    "compute": "Compute Instances",
+    "vbinstance": "Visual Builder Components",
+    "dataintegration": "Data Integration services",
+    "database": "Oracle, MySQL and NoSQL Databases",
+    "oda": "Digital Assistants",
+    "analytics": "Analytics",
+    "integration": "Integration",
+    "devops": "DevOps Projects",
+    "ocvs": "Oracle Cloud VMware solution",
+    "dbmigration": "Database Migrations",
+    "migration": "Migrations",
+    "goldengate": "GoldenGate",
+    "bastion": "Bastion Services",
+    "waf": "Web Application Firewall",
+    "cloudguard": "Cloud Guard Services",
+    "oke": "OKE Clusters",
+    "ocir": "Repositories",
+    "datascience": "DataScience Components",
+    "apigateway": "API Gateway Service",
+    "datasafe": "Datasafe services",
+    "datacatalog": "Data Catalog services",
+    "blockchain": "Blockchain",
+    "rm": "Resource Manager Stacks",
+    "dataflow": "Data Flow Services",
+    "block": "Block Volumes",
+    "fss": "FileSystem and Mount Targets",
+    "network": "Network Components",
+    "observability": "Observability Components",
+    "iam": "IAM Components",
+}
+
+# Categories only listed in the home region
+HomeRegionCategories = ["iam"]
+
+
+##########################################################################
+# CompilePlan
+# Selected registry entries, in registry order and without duplicates
+##########################################################################
+def CompilePlan(objects, top5=False):
+    plan = []
+    seen = set()
+    for category, ServiceClient, ServiceName, options, istop5 in Services:
+        selected = istop5 if top5 else ("all" in objects or category in objects)
+        if selected and (ServiceClient, ServiceName) not in seen:
+            seen.add((ServiceClient, ServiceName))
+            plan.append((category, ServiceClient, ServiceName, options))
+    return plan
+
+
+def UnknownCategories(objects):
+    return [o for o in objects if o not in Categories and o not in ("all", "Top 5")]
+
+
+##########################################################################
+# RegionPlan
+# Entries of the plan that are listed in region
+##########################################################################
+def RegionPlan(plan, region, homeregion):
+    return [entry for entry in plan if entry[0] not in HomeRegionCategories or region == homeregion]
+
+
+##########################################################################
+# RunPlan
+# Lists every entry of the (region) plan with ListAny
+##########################################################################
+def RunPlan(config, signer, plan, compartments):
+    PlanSearch(config, plan)
+    category = ""
+    for entry in plan:
+        if entry[0] != category:
+            category = entry[0]
+            print_header("Listing " + Categories[category] + " at " + CurrentTimeString() + "@ " + config["region"], 1)
+        ListAny(config, signer, compartments, entry[1], entry[2], **entry[3])
+
+
+##########################################################################
+# RunRegions
+# Lists the plan in every region, the services that are not available in
+# a region are left out of its plan. Waits for the work units of a region
+# before starting the next one
+##########################################################################
+def RunRegions(config, signer, plan, regions, homeregion, compartments, workers=DefaultWorkers):
+    for region in regions:
+
+        print_header("Listing resources in region " + region, 0)
+        config["region"] = region
+
+        RunPlan(config, signer, ProbePlan(config, signer, RegionPlan(plan, region, homeregion), workers), compartments)
+
+        executor = GetExecutor()
+        if executor:
+            print_header("Waiting for listing in " + region + " to complete...", 2)
+            for error in executor.wait():
+                print("Error in work unit: " + str(error))
+        DropSearch(config)
+
+
+##########################################################################
+# PlanCalls
+# Number of list calls (at least one per unit, more for paged results)
+# the plan issues in the region of config, per category
+##########################################################################
+def PlanCalls(config, signer, plan, compartments):
+    calls = {}
+    search = False
+    for category, ServiceClient, ServiceName, options in plan:
+        if SearchSupported(ServiceClient, ServiceName):
+            search = True
+            units = 0
+        elif options.get("Subtree"):
+            units = 1
+        elif options.get("PerAD"):
+            units = len(compartments) * len(GetAvailabilityDomains(config, signer))
+        else:
+            units = len(compartments)
+        calls[category] = calls.get(category, 0) + units
+    if search:
+        calls["search"] = 1
+    return calls
+
+
+##########################################################################
+# PrintPlan
+# Dry run, prints the number of list calls per region. Services are not
+# probed, only the results of --probe-cache leave services out
+##########################################################################
+def PrintPlan(config, signer, plan, regions, homeregion, compartments):
+    print_header("Plan", 1)
+    region_config = dict(config)
+    total = 0
+    for region in regions:
+        region_config["region"] = region
+        regionplan, probes = CachedPlan(region_config, RegionPlan(plan, region, homeregion))
+        calls = PlanCalls(region_config, signer, regionplan, compartments)
+        if probes:
+            calls["probe"] = probes
+        print("\n" + region + " : " + str(sum(calls.values())) + " API calls or more")
+        for category, count in calls.items():
+            print("  {:<20} {}".format(category, count))
+        total += sum(calls.values())
+    print("\nTotal              : " + str(total) + " API calls or more, " + str(len(plan)) + " object types, " + str(len(compartments)) + " compartments")
@@ -0,0 +1,177 @@
+import importlib
+import oci
+import threading
+from ocimodules.Clients import GetClient
+from ocimodules.RateLimit import Limited, GetRetryStrategy
+from ocimodules.Checkpoint import GetJournal, UnitKey
+from ocimodules.Records import BuildRecord, EmitRecord, SafePrint
+from ocimodules import Details
+
+# Listing engine, "list" calls the list_* operation per compartment,
+# "search" takes the objects from one Resource Search query per region
+Engine = "list"
+
+# Resource Search types of the objects listed by ListAny.
+# Objects not in here are not indexed by search and are always listed with ListAny
+SearchTypes = {
+    ("core.ComputeClient", "instance"): "Instance",
+    ("core.BlockstorageClient", "volume"): "Volume",
+    ("core.BlockstorageClient", "volume_backup"): "VolumeBackup",
+    ("core.BlockstorageClient", "boot_volume"): "BootVolume",
+    ("core.BlockstorageClient", "boot_volume_backup"): "BootVolumeBackup",
+    ("core.VirtualNetworkClient", "drg"): "Drg",
+    ("core.VirtualNetworkClient", "local_peering_gateway"): "LocalPeeringGateway",
+    ("core.VirtualNetworkClient", "remote_peering_connection"): "RemotePeeringConnection",
+    ("database.DatabaseClient", "db_system"): "DbSystem",
+    ("database.DatabaseClient", "autonomous_database"): "AutonomousDatabase",
+    ("mysql.DbSystemClient", "db_system"): "MysqlDbSystem",
+    ("analytics.AnalyticsClient", "analytics_instance"): "AnalyticsInstance",
+    ("integration.IntegrationInstanceClient", "integration_instance"): "IntegrationInstance",
+    ("oda.OdaClient", "oda_instance"): "OdaInstance",
+    ("container_engine.ContainerEngineClient", "cluster"): "ClustersCluster",
+    ("bastion.BastionClient", "bastion"): "Bastion",
+    ("file_storage.FileStorageClient", "file_system"): "FileSystem",
+    ("data_integration.DataIntegrationClient", "workspace"): "DISWorkspace",
+    ("data_catalog.DataCatalogClient", "catalog"): "DataCatalog",
+    ("data_science.DataScienceClient", "model"): "DataScienceModel",
+    ("data_science.DataScienceClient", "model_deployment"): "DataScienceModelDeployment",
+    ("data_science.DataScienceClient", "project"): "DataScienceProject",
+    ("data_flow.DataFlowClient", "application"): "DataFlowApplication",
+    ("data_flow.DataFlowClient", "run"): "DataFlowRun",
+    ("apigateway.GatewayClient", "gateway"): "ApiGateway",
+    ("apigateway.DeploymentClient", "deployment"): "ApiDeployment",
+    ("golden_gate.GoldenGateClient", "deployment"): "GoldenGateDeployment",
+    ("golden_gate.GoldenGateClient", "database_registration"): "GoldenGateDatabaseRegistration",
+    ("resource_manager.ResourceManagerClient", "stack"): "OrmStack",
+    ("resource_manager.ResourceManagerClient", "configuration_source_provider"): "OrmConfigSourceProvider",
+    ("monitoring.MonitoringClient", "alarm"): "Alarm",
+    ("ons.NotificationControlPlaneClient", "topic"): "OnsTopic",
+    ("events.EventsClient", "rule"): "EventRule",
+    ("identity.IdentityClient", "policy"): "Policy",
+    ("identity.IdentityClient", "dynamic_group"): "DynamicResourceGroup",
+}
+
+# Search results per (region, tenancy), resource type -> list of ResourceSummary,
+# kept until the region is listed, and the search types of the region plan
+RegionResources = {}
+RegionTypes = {}
+SearchLock = threading.Lock()
+
+
+##########################################################################
+# SearchItem
+# Presents a search ResourceSummary with the attributes of a listed item
+##########################################################################
+class SearchItem:
+
+    def __init__(self, resource, ObjectNameVar="display_name"):
+        setattr(self, ObjectNameVar, resource.display_name)
+        self.lifecycle_state = resource.lifecycle_state
+        self.id = resource.identifier
+        self.compartment_id = resource.compartment_id
+        self.defined_tags = resource.defined_tags
+        self.time_created = resource.time_created
+
+
+def SetEngine(engine):
+    global Engine
+    Engine = engine
+
+
+def SearchSupported(ServiceClient, ServiceName):
+    return Engine == "search" and (ServiceClient, ServiceName) in SearchTypes
+
+
+##########################################################################
+# PlanSearch / DropSearch
+# Sets the search types of the plan of the region of config, the query
+# of the region asks for these only. DropSearch frees the search results
+# of the region once it is listed
+##########################################################################
+def PlanSearch(config, plan):
+    types = set(SearchTypes[(ServiceClient, ServiceName)] for category, ServiceClient, ServiceName, options in plan if SearchSupported(ServiceClient, ServiceName))
+    with SearchLock:
+        RegionTypes[(config["region"], config["tenancy"])] = types
+
+
+def DropSearch(config):
+    key = (config["region"], config["tenancy"])
+    with SearchLock:
+        RegionResources.pop(key, None)
+        RegionTypes.pop(key, None)
+
+
+##########################################################################
+# GetRegionResources
+# Runs one structured query for the search types of the region plan (all
+# types without a plan) in the region of the config and buckets the
+# results by resource type, the result is kept until DropSearch.
+# None if the search failed, the types are then listed with ListAny
+##########################################################################
+def GetRegionResources(config, signer):
+    region = config["region"]
+    key = (region, config["tenancy"])
+    with SearchLock:
+        if key not in RegionResources:
+            search = GetClient("resource_search.ResourceSearchClient", config, signer)
+            models = importlib.import_module("oci.resource_search.models")
+            query = "query {} resources".format(", ".join(sorted(RegionTypes.get(key) or set(SearchTypes.values()))))
+            details = models.StructuredSearchDetails(type="Structured", query=query, matching_context_type="NONE")
+            resources = None
+            try:
+                SafePrint("Searching all objects in {}                 ".format(region), end="\r")
+                results = oci.pagination.list_call_get_all_results(Limited(search, search.search_resources), details, limit=1000, retry_strategy=GetRetryStrategy()).data
+                resources = {}
+                for resource in results:
+                    resources.setdefault(resource.resource_type.lower(), []).append(resource)
+            except oci.exceptions.ServiceError as response:
+                SafePrint("error {}-{} trying to search: {}, listing per compartment".format(response.code, response.message, region))
+            except (oci.exceptions.RequestException, oci.exceptions.ConnectTimeout) as e:
+                SafePrint("error trying to search: {} ({}), listing per compartment".format(region, str(e).split("\n")[0][:80]))
+            RegionResources[key] = resources
+        return RegionResources[key]
+
+
+##########################################################################
+# SearchAny
+# Emits the records of one object type from the search results,
+# only for objects in the compartments to process. Returns False if the
+# search of the region failed, nothing is journaled or emitted then
+##########################################################################
+def SearchAny(config, signer, Compartments, ServiceClient, ServiceName, ObjectNameVar="display_name", GetCommand=""):
+    try:
+        journal = GetJournal()
+        unit = UnitKey(config["region"], ServiceClient, ServiceName, "search")
+        if journal and (not journal.owns(unit) or journal.done(unit)):
+            return True
+        # A resumed run whose search failed before goes on listing per compartment
+        if journal and any(journal.done(UnitKey(config["region"], ServiceClient, ServiceName, C.details.id)) for C in Compartments):
+            return False
+
+        resources = GetRegionResources(config, signer)
+        if resources is None:
+            return False
+        resources = resources.get(SearchTypes[(ServiceClient, ServiceName)].lower(), [])
+        compartments = {C.details.id: C for C in Compartments}
+        items = []
+        records = []
+        for resource in resources:
+            C = compartments.get(resource.compartment_id)
+            if C is None:
+                continue
+            if resource.lifecycle_state and resource.lifecycle_state.lower() in ("deleted", "terminated"):
+                continue
+            items.append(SearchItem(resource, ObjectNameVar))
+            records.append(BuildRecord(config, items[-1], ServiceName, C.fullpath, ObjectNameVar))
+        # Search results have no details, they are read with get_*
+        if records and Details.Level:
+            Details.Enrich(GetClient(ServiceClient, config, signer), ServiceClient, ServiceName, GetCommand, items, records)
+
+        if journal:
+            journal.commit(unit, records)
+        for record in records:
+            EmitRecord(record)
+
+    except Exception as e:
+        SafePrint(f'\nError in SearchAny, {ServiceClient}:{ServiceName}: {str(e)}')
+    return True
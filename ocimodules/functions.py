@@ -3,16 +3,18 @@ import argparse
 import oci
 import os
 import sys
-from ocimodules.AnyList import ListAny
-#from ocimodules.functions import print_header, input_command_line, create_signer, check_oci_version
-from ocimodules.IAM import Login, SubscribedRegions, GetHomeRegion, GetTenantName
+import time
+from ocimodules.Executor import DefaultWorkers, DefaultEndpointWorkers
+from ocimodules.Clients import DefaultPoolSize
+from ocimodules.RateLimit import DefaultRate
+from ocimodules.Capabilities import DefaultTTL
+from ocimodules.IAM import DefaultCompartmentTTL
 
 ##########################################################################
 # todo: 
 #   - add "if verbose" to list out detail items
 #   - fix up objects that are not implemented
 #   - refactor things out of list.py into here
-#   - find a "procedural" approach instead of individual service functions
 ##########################################################################
 
 ##########################################################################
@@ -29,6 +31,26 @@ def clear():
         _ = os.system('clear')
 
 
+##########################################################################
+# Current time for headers
+##########################################################################
+def CurrentTimeString():
+    return time.strftime("%D %H:%M:%S", time.localtime())
+
+
+##########################################################################
+# Peak memory (RSS) of the process in MB, None if not available
+##########################################################################
+def PeakMemoryMB():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
 ##########################################################################
 # Print header centered
 ##########################################################################
@@ -56,6 +78,29 @@ def input_command_line(help=False):
     parser.add_argument("-c", "--compartment", default="", dest='compartment', help="top level compartment id to dellistete")
     parser.add_argument("-o", "--objects", dest='objects', default="all", help="Comma-separated list of components to list (e.g., compute,visualbuilder). Default is 'all'")
     parser.add_argument('--top5', action='store_true', default=False, dest='top5', help='List only the "top 5" components. Overrides objects. Ok... more than 5.')
+    parser.add_argument("-w", "--workers", type=int, default=DefaultWorkers, dest='workers', help='Number of concurrent list calls, 1 lists serially. Default is {}'.format(DefaultWorkers))
+    parser.add_argument("--endpoint-workers", type=int, default=DefaultEndpointWorkers, dest='endpoint_workers', help='Max concurrent list calls per service endpoint. Default is {}'.format(DefaultEndpointWorkers))
+    parser.add_argument('--compartment-cache', default="", dest='compartment_cache', help='File caching the compartment trees between runs')
+    parser.add_argument('--compartment-ttl', type=float, default=DefaultCompartmentTTL, dest='compartment_ttl', help='Hours a cached compartment tree is used, if unchanged. Default is {}'.format(DefaultCompartmentTTL))
+    parser.add_argument('--refresh-compartments', action='store_true', default=False, dest='refresh_compartments', help='Rebuild the cached compartment tree')
+    parser.add_argument('--subtree', action='store_true', default=False, dest='subtree', help='Load all compartments with one subtree query instead of walking the tree, walks it if the query is not authorized')
+    parser.add_argument('-q', '--quiet', action='store_true', default=False, dest='quiet', help='Write the output only to the log file, not to the terminal. Implies -f')
+    parser.add_argument('--no-log-records', action='store_true', default=False, dest='no_log_records', help='Write listed records only to the csv file, not to the log file')
+    parser.add_argument('--engine', choices=['list', 'search'], default='list', dest='engine', help='list calls the list API per compartment, search uses Resource Search where available. Default is list')
+    parser.add_argument('--cost-days', type=int, default=0, dest='cost_days', help='Cost column: cost of every object in the last N days, from the Usage API. Default is 0, no costs')
+    parser.add_argument('--detail', type=int, choices=[0, 1, 2, 3], default=0, dest='detail', help='Details column: 1 sizing (shape, OCPUs, storage), 2 and configuration, 3 all attributes (get call per object). Default is 0, no details')
+    parser.add_argument('--pool-size', type=int, default=DefaultPoolSize, dest='pool_size', help='HTTP connections kept open per service client. Default is {}'.format(DefaultPoolSize))
+    parser.add_argument('--rate', type=float, default=DefaultRate, dest='rate', help='Max API calls per second per service endpoint. Default is no limit, calls are slowed down on throttling (429)')
+    parser.add_argument('--resume', action='store_true', default=False, dest='resume', help='Resume an interrupted run, skipping the units already in the checkpoint journal')
+    parser.add_argument('--plan', action='store_true', default=False, dest='plan', help='Dry run, print the number of API calls per region and exit. Services are not probed, only --probe-cache is used')
+    parser.add_argument('--profiles', default="", dest='profiles', help='Batch mode, comma-separated config profiles of the tenancies to list concurrently')
+    parser.add_argument('--manifest', default="", dest='manifest', help='Batch mode, json file with the runs (profile, compartment, regions, objects) to list concurrently')
+    parser.add_argument('--shard', default="", dest='shard', help='List only shard i of N (i/N, from 0) of the work units and write a manifest for shard.py merge')
+    parser.add_argument('--no-probe', action='store_true', default=False, dest='no_probe', help='Do not probe which services are available in each region before listing')
+    parser.add_argument('--probe-cache', default="", dest='probe_cache', help='File caching the probe results between runs')
+    parser.add_argument('--probe-ttl', type=float, default=DefaultTTL, dest='probe_ttl', help='Hours a cached probe result is used. Default is {}'.format(DefaultTTL))
+    parser.add_argument('--format', default="csv", dest='format', help='Comma-separated output formats next to the csv file: jsonl, parquet (needs pyarrow), sqlite. Default is csv')
+    parser.add_argument('--prom-file', default="", dest='prom_file', help='Prometheus textfile for the run metrics. Default is <log file>.prom')
     parser.add_argument('--opencsv', action='store_true', default=False, dest='opencsv', help='Open CSV file at end of execution. Default is false')
     cmd = parser.parse_args()
     if help:
@@ -159,198 +204,3 @@ def check_oci_version(min_oci_version_required):
         print("Min SDK required: {}".format(min_oci_version_required))
         print("pip install --upgrade oci")
         quit()
-
-##########################################################################
-# Add functionality to only output the components that the user wants
-##########################################################################
-
-def list_compute_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "core.ComputeClient", "instance")
-    # ListAny(config, signer, processCompartments, "core.ComputeClient", "image")
-    # ListAny(config, signer, processCompartments, "core.ComputeClient", "dedicated_vm_host")
-    # ListAny(config, signer, processCompartments, "core.ComputeManagementClient", "instance_pool")
-    # ListAny(config, signer, processCompartments, "core.ComputeManagementClient", "instance_configuration")
-    # ListAny(config, signer, processCompartments, "autoscaling.AutoScalingClient", "auto_scaling_configuration")
-    # ListAny(config, signer, processCompartments, "os_management.OsManagementClient", "managed_instance_group")
-    # ListAny(config, signer, processCompartments, "os_management.OsManagementClient", "scheduled_job")
-    # ListAny(config, signer, processCompartments, "os_management.OsManagementClient", "software_source")
-    # ListAny(config, signer, processCompartments, "management_agent.ManagementAgentClient", "management_agent")
-    # # ListAny(config, signer, processCompartments, "management_agent.ManagementAgentClient", "management_agent_install_key")
-
-def list_vb_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "visual_builder.VbInstanceClient", "vb_instance")
-
-def list_di_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "data_integration.DataIntegrationClient", "workspace")
-
-def list_db_components(config, signer, processCompartments):
-    #Oracle DB
-    ListAny(config, signer, processCompartments, "database.DatabaseClient", "db_system")
-    ListAny(config, signer, processCompartments, "database.DatabaseClient", "autonomous_database")
-    #ListAny(config, signer, processCompartments, "database.DatabaseClient", "backup")
-
-def list_mysql_components(config, signer, processCompartments):
-    #MySQL
-    ListAny(config, signer, processCompartments, "mysql.DbSystemClient", "db_system")
-
-def list_nosql_components(config, signer, processCompartments):
-    #NoSQL
-    ListAny(config, signer, processCompartments, "nosql.NosqlClient", "table", ServiceID="table_name_or_id")
-
-def list_oda_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "oda.OdaClient", "oda_instance")
-
-def list_oac_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "analytics.AnalyticsClient", "analytics_instance", ObjectNameVar="name")
-    # ListAny(config, signer, processCompartments, "streaming.StreamAdminClient", "stream", ObjectNameVar="name")
-    # ListAny(config, signer, processCompartments, "streaming.StreamAdminClient", "stream_pool", ObjectNameVar="name")
-    # ListAny(config, signer, processCompartments, "streaming.StreamAdminClient", "connect_harness", ObjectNameVar="name")
-    # ListAny(config, signer, processCompartments, "sch.ServiceConnectorClient", "service_connector")
-
-def list_integ_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "integration.IntegrationInstanceClient", "integration_instance")
- 
-def list_devops_components(config, signer, processCompartments):
-    elements = ["deploy_stage", "deploy_artifact", "deploy_environment", "deploy_pipeline", "build_pipeline"]
-    for element in elements:
-        ListAny(config, signer, processCompartments, "devops.DevopsClient", element)
-        ListAny(config, signer, processCompartments, "devops.DevopsClient", "repository", ObjectNameVar="name")
-        ListAny(config, signer, processCompartments, "devops.DevopsClient", "project", ObjectNameVar="name")
-
-def list_ocvs_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "ocvp.SddcClient", "sddc")
-
-def list_dbmigration_components(config, signer, processCompartments):
-    elements = ["migration", "connection"]
-    for element in elements:
-        ListAny(config, signer, processCompartments, "database_migration.DatabaseMigrationClient", element)
-
-def list_migration_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "cloud_migrations.MigrationClient", "migration_plan")
-    ListAny(config, signer, processCompartments, "cloud_migrations.MigrationClient", "migration")
-    ListAny(config, signer, processCompartments, "cloud_migrations.MigrationClient", "replication_schedule")
-    ListAny(config, signer, processCompartments, "cloud_bridge.OcbAgentSvcClient", "environment")
-    ListAny(config, signer, processCompartments, "cloud_bridge.OcbAgentSvcClient", "agent_dependency")
-    ListAny(config, signer, processCompartments, "cloud_bridge.DiscoveryClient", "asset_source")
-    ListAny(config, signer, processCompartments, "cloud_bridge.DiscoveryClient", "discovery_schedule")
-    ListAny(config, signer, processCompartments, "cloud_bridge.InventoryClient", "asset")
-    ListAny(config, signer, processCompartments, "cloud_bridge.InventoryClient", "inventory")
-
-def list_gg_components(config, signer, processCompartments):
-    elements = ["database_registration", "deployment", "deployment_backup"]
-    for element in elements:
-        ListAny(config, signer, processCompartments, "golden_gate.GoldenGateClient", element)
-
-def list_bastion_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "bastion.BastionClient", "bastion", ObjectNameVar="name")
-
-def list_waf_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "waf.WafClient", "web_app_firewall")
-    # ListAny(config, signer, processCompartments, "waf.WafClient", "web_app_firewall_policy")
-
-#def list_os_components(config, signer, processCompartments):
-    ## todo object storage
-    # ListAny(config, signer, processCompartments, "data_integration.DataIntegrationClient", "workspace")
-
-def list_cloudguard_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "cloud_guard.CloudGuardClient", "target")
-    ListAny(config, signer, processCompartments, "cloud_guard.CloudGuardClient", "detector_recipe")
-    ListAny(config, signer, processCompartments, "cloud_guard.CloudGuardClient", "responder_recipe")
-    ListAny(config, signer, processCompartments, "cloud_guard.CloudGuardClient", "managed_list")
-
-# def list_email_components(config, signer, processCompartments):
-#     ListAny(config, signer, processCompartments, "email.EmailClient", "sender", ObjectNameVar="email_address")
-#     if processRootCompartment:
-#         ListAny(config, signer, processRootCompartment, "email.EmailClient", "suppression", ObjectNameVar="email_address")
-#     ListAny(config, signer, processCompartments, "email.EmailClient", "email_domain", ObjectNameVar="name")
-
-def list_oke_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "container_engine.ContainerEngineClient", "cluster", ObjectNameVar="name")
-
-def list_ocir_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "artifacts.ArtifactsClient", "container_repository", ServiceID="repository_id")
-    ListAny(config, signer, processCompartments, "artifacts.ArtifactsClient", "repository")
-
-def list_ds_components(config, signer, processCompartments):
-    # ListAny(config, signer, processCompartments, "data_science.DataScienceClient", "notebook_session")
-    ListAny(config, signer, processCompartments, "data_science.DataScienceClient", "model_deployment")
-    ListAny(config, signer, processCompartments, "data_science.DataScienceClient", "model")
-    ListAny(config, signer, processCompartments, "data_science.DataScienceClient", "project")
-
-# def list_fn_components(config, signer, processCompartments):
-#     ## todo functions service
-#     ListAny(config, signer, processCompartments, "data_integration.DataIntegrationClient", "workspace")
-
-def list_apigw_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "apigateway.DeploymentClient", "deployment")
-    ListAny(config, signer, processCompartments, "apigateway.GatewayClient", "gateway")
-    ListAny(config, signer, processCompartments, "apigateway.ApiGatewayClient", "api")
-    ListAny(config, signer, processCompartments, "apigateway.ApiGatewayClient", "certificate")
-
-def list_datasafe_components(config, signer, processCompartments):
-    # ListAny(config, signer, processCompartments, "data_safe.DataSafeClient", "user_assessment")
-    # ListAny(config, signer, processCompartments, "data_safe.DataSafeClient", "security_assessment")
-    ListAny(config, signer, processCompartments, "data_safe.DataSafeClient", "target_database")
-    ListAny(config, signer, processCompartments, "data_safe.DataSafeClient", "on_prem_connector")
-    ListAny(config, signer, processCompartments, "data_safe.DataSafeClient", "data_safe_private_endpoint")
-
-# def list_dbmanagement_components(config, signer, processCompartments):
-#     DisableDatabaseManagement(config, signer, processCompartments)
-#     ListAny(config, signer, processCompartments, "database_management.DbManagementClient", "db_management_private_endpoint", ObjectNameVar="name")
-#     ListAny(config, signer, processCompartments, "database_management.DbManagementClient", "managed_database_group", ObjectNameVar="name", DelState="", DelingSate="")
-
-# def list_loganalytics_components(config, signer, processCompartments):
-#     ListAny(config, signer, processCompartments, "log_analytics.LogAnalyticsClient", "log_analytics_entity", ObjectNameVar="name", Extra=", namespace_name=\"{}\"".format(tenant_name))
-
-def list_datacatalog_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "data_catalog.DataCatalogClient", "catalog")
-    ListAny(config, signer, processCompartments, "data_catalog.DataCatalogClient", "catalog_private_endpoint")
-    ListAny(config, signer, processCompartments, "data_catalog.DataCatalogClient", "metastore")
-
-def list_blockchain_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "blockchain.BlockchainPlatformClient", "blockchain_platform")
-
-def list_rm_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "resource_manager.ResourceManagerClient", "stack")
-    ListAny(config, signer, processCompartments, "resource_manager.ResourceManagerClient", "configuration_source_provider")
-
-# def list_anomaly_components(config, signer, processCompartments):
-    # ListAny(config, signer, processCompartments, "ai_anomaly_detection.AnomalyDetectionClient", "data_asset")
-    # ListAny(config, signer, processCompartments, "ai_anomaly_detection.AnomalyDetectionClient", "model")
-    # ListAny(config, signer, processCompartments, "ai_anomaly_detection.AnomalyDetectionClient", "project")
-
-def list_dataflow_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "data_flow.DataFlowClient", "private_endpoint")
-    ListAny(config, signer, processCompartments, "data_flow.DataFlowClient", "application")
-    ListAny(config, signer, processCompartments, "data_flow.DataFlowClient", "run")
-
-def list_block_components(config, signer, processCompartments):
-    # ListAny(config, signer, processCompartments, "core.BlockstorageClient", "volume_group")
-    # ListAny(config, signer, processCompartments, "core.BlockstorageClient", "volume_group_backup")
-    ListAny(config, signer, processCompartments, "core.BlockstorageClient", "volume")
-    ListAny(config, signer, processCompartments, "core.BlockstorageClient", "volume_backup")
-    ListAny(config, signer, processCompartments, "core.BlockstorageClient", "boot_volume")
-    ListAny(config, signer, processCompartments, "core.BlockstorageClient", "boot_volume_backup")
-    # ListAny(config, signer, processCompartments, "core.BlockstorageClient", "volume_backup_policy", ServiceID="policy_id")
-
-def list_fss_components(config, signer, processCompartments):
-    # ListAny(config, signer, processCompartments, "file_storage.FileStorageClient", "mount_target", PerAD=True)
-    ListAny(config, signer, processCompartments, "file_storage.FileStorageClient", "file_system", PerAD=True)
-
-def list_network_components(config, signer, processCompartments):
-    #DeleteVCN(config, signer, processCompartments)
-    ListAny(config, signer, processCompartments, "core.VirtualNetworkClient", "local_peering_gateway")
-    ListAny(config, signer, processCompartments, "core.VirtualNetworkClient", "remote_peering_connection")
-    ListAny(config, signer, processCompartments, "core.VirtualNetworkClient", "drg")
-
-def list_observability_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "monitoring.MonitoringClient", "alarm")
-    ListAny(config, signer, processCompartments, "ons.NotificationControlPlaneClient", "topic", ObjectNameVar="name", ServiceID="topic_id", ReturnServiceID="topic_id")
-    ListAny(config, signer, processCompartments, "events.EventsClient", "rule")
-    #DeleteLogGroups(config, signer, processCompartments)
-    #DeleteAPM(config, signer, processCompartments)
-
-def list_iam_components(config, signer, processCompartments):
-    ListAny(config, signer, processCompartments, "identity.IdentityClient", "policy", ObjectNameVar="name")
-    ListAny(config, signer, processCompartments, "identity.IdentityClient", "dynamic_group", ObjectNameVar="name")
-    ## todo add users and groups
@@ -1,64 +1,144 @@
 import csv
+import os
+import shutil
+from multiprocessing import Pool
+from ocimodules.Records import CSV_HEADER, RecordToRow
 
-def parse_text_to_csv(input_file, output_csv_file, debug):
+# Logs smaller than this per worker are not split
+MinChunkSize = 8 * 1024 * 1024
+
+
+def is_delimiter(line):
+    # The opening delimiter may follow a progress message on the same line
+    return line.endswith("-" * 20)
+
+
+def iter_records(lines, debug=False):
+    """
+    Streams the records out of the lines of a log file.
+
+    A record starts at a "Service:" line and ends at the dashed delimiter (or at the
+    next "Service:" line), every "key: value" line in between is a field of the record.
+
+    Args:
+        lines (iterable): The lines of the log file, read lazily.
+        debug (bool): Print every line of a record while parsing.
+    """
+    data = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line.startswith("Service:"):
+            if data:
+                yield data
+            data = {}
+        elif data is None:
+            continue
+        elif is_delimiter(line):
+            yield data
+            data = None
+            continue
+
+        if debug:
+            print("Line:", line.strip())  # Print the line for debugging
+        if ": " in line:  # Check if the delimiter is present
+            key, value = line.split(": ", 1)
+            data[key.strip()] = value.strip()
+        elif line.strip().endswith(":"):
+            data[line.strip()[:-1]] = ""
+        else:
+            print("Skipping line due to missing delimiter:", line.strip())
+    if data:
+        yield data
+
+
+def find_chunks(input_file, chunks):
+    """
+    Splits the log file in byte ranges at record boundaries ("Service:" lines).
+
+    Returns a list of (start, end) offsets.
+    """
+    size = os.path.getsize(input_file)
+    offsets = [0]
+    with open(input_file, 'rb') as f:
+        for k in range(1, chunks):
+            f.seek(max(size * k // chunks, offsets[-1]))
+            f.readline()  # skip the partial line
+            while True:
+                position = f.tell()
+                line = f.readline()
+                if not line:
+                    position = size
+                    break
+                if line.startswith(b"Service:"):
+                    break
+            if position > offsets[-1]:
+                offsets.append(position)
+    offsets.append(size)
+    return [(offsets[k], offsets[k + 1]) for k in range(len(offsets) - 1) if offsets[k] < offsets[k + 1]]
+
+
+def iter_chunk_lines(input_file, start, end):
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line.decode('utf-8', errors='replace')
+
+
+def parse_chunk(args):
+    """
+    Parses one byte range of the log file into a partial CSV file (without header).
+    """
+    input_file, start, end, part_file, debug = args
+    with open(part_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        for data in iter_records(iter_chunk_lines(input_file, start, end), debug):
+            writer.writerow(RecordToRow(data))
+    return part_file
+
+
+def parse_text_to_csv(input_file, output_csv_file, debug, workers=1):
     """
     Parses the input TXT file containing instance details and writes the data to a CSV file.
 
+    The file is read lazily, large files are split at record boundaries and parsed by
+    several processes when workers is more than 1.
+
     Args:
         input_file (str): The path to the input TXT file.
         output_csv_file (str): The name of the output CSV file.
+        debug (bool): Print every parsed line.
+        workers (int): Number of processes parsing the file.
     """
 
-    debug = debug 
-    with open(input_file, 'r') as f:
-        lines = f.readlines()
+    chunks = min(workers, max(1, os.path.getsize(input_file) // MinChunkSize))
 
-    with open(output_csv_file, 'w', newline='') as csvfile:
+    with open(output_csv_file, 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
 
         # Write the header row
-        writer.writerow(['Service', 'Region', 'Compartment', 'display_name', 'lifecycle_state', 'id', 'compartment_id', 'created_by', 'created_on', 'EOL', 'LifeTime', 'time_created', 'parent_compartment', 'assigned_to', 'Action', 'Justification'])
+        writer.writerow(CSV_HEADER)
         # todo add category
 
-        i = 0
-        while i < len(lines):
-            if lines[i].startswith("Service:"):
-                data = {}
-                for j in range(i, i + 12):  # Capture the next 12 lines
-                    try:
-                        line = lines[j]
-                        if debug:
-                            print("Line:", line.strip())  # Print the line for debugging
-                        if ": " in line:  # Check if the delimiter is present
-                            key, value = line.strip().split(": ", 1)
-                            data[key] = value
-                            compartment = data.get('Compartment', 'N/A')
-                            parent_compartment = compartment.split('/')[2] if compartment.startswith('/root/') and len(compartment.split('/')) > 2 else 'N/A'
-                        else:
-                            print("Skipping line due to missing delimiter:", line.strip())
-                    except IndexError:
-                        break  # Handle cases with fewer than 12 lines remaining
-                    except ValueError:
-                        print("Skipping line due to ValueError:", line.strip())  # Error handling
-                        continue
-
-                writer.writerow([
-                    # print N/A to column if value is not found
-                    data.get('Service', 'N/A'), 
-                    # todo add category
-                    data.get('Region', 'N/A'),
-                    data.get('Compartment', 'N/A'),
-                    data.get('display_name', 'N/A'),
-                    data.get('lifecycle_state', 'N/A'),
-                    data.get('id', 'N/A'),
-                    data.get('compartment_id', 'N/A'),
-                    data.get('created_by', 'N/A'),
-                    data.get('created_on', 'N/A'),
-                    data.get('EOL', 'N/A'),
-                    data.get('LifeTime', 'N/A'),
-                    data.get('time_created', 'N/A'),
-                    parent_compartment
-                ])
-                i += 12  # Move to the next potential data block
-            else:
-                i += 1
+        if chunks <= 1:
+            with open(input_file, 'r', encoding='utf-8', errors='replace') as f:
+                for data in iter_records(f, debug):
+                    writer.writerow(RecordToRow(data))
+            return
+
+        jobs = []
+        for k, (start, end) in enumerate(find_chunks(input_file, chunks)):
+            jobs.append((input_file, start, end, "{}.part{}".format(output_csv_file, k), debug))
+
+        with Pool(processes=len(jobs)) as pool:
+            part_files = pool.map(parse_chunk, jobs)
+
+        csvfile.flush()
+        for part_file in part_files:
+            with open(part_file, 'r', newline='', encoding='utf-8') as part:
+                shutil.copyfileobj(part, csvfile)
+            os.remove(part_file)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+##########################################################################################
+# OCI-SuperList shards                                                                   #
+#                                                                                        #
+# Runs list.py as N shards (--shard i/N) and merges their partial outputs               #
+##########################################################################################
+# Usage
+#
+#   python3 shard.py run N [-log log.txt] -- <list.py options>
+#       Runs N local list.py processes, shard i writes <log>.shard<i>of<N>.*, then merges
+#       them into <log>.csv
+#
+#   python3 shard.py merge <log>.shard*.manifest.json [--outfile log.txt.csv] [--force]
+#       Merges the csv files of the shard manifests, after checking that every work unit
+#       of the plan was listed by exactly one shard
+##########################################################################################
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+
+MaxFailedShown = 10    # failed units printed by the merge
+
+
+##########################################################################
+# ValidateShards
+# Returns the problems found in the manifests of a sharded run: all shards
+# must have the same plan, together own every unit of it exactly once and
+# have attempted all of their units. Units that failed with an error
+# answer are reported by FailedUnits, not here
+##########################################################################
+def ValidateShards(manifests):
+    problems = []
+    counts = set(m["count"] for m in manifests)
+    if len(counts) != 1:
+        return ["shards of different runs, shard counts " + ", ".join(str(c) for c in sorted(counts))]
+    count = counts.pop()
+
+    shards = sorted(m["shard"] for m in manifests)
+    if shards != list(range(count)):
+        duplicates = sorted(set(s for s in shards if shards.count(s) > 1))
+        absent = sorted(set(range(count)) - set(shards))
+        if duplicates:
+            problems.append("duplicate shards: " + ", ".join(str(s) for s in duplicates))
+        if absent:
+            problems.append("missing shards: " + ", ".join(str(s) for s in absent))
+
+    plans = set((m["planned"], m["planned_digest"]) for m in manifests)
+    if len(plans) != 1:
+        problems.append("shards listed different plans (compartments, regions or available services changed between shards)")
+    else:
+        planned, planned_digest = plans.pop()
+        owned = sum(m["owned"] for m in manifests)
+        owned_digest = 0
+        for m in manifests:
+            owned_digest ^= int(m["owned_digest"], 16)
+        if owned != planned or "{:016x}".format(owned_digest) != planned_digest:
+            problems.append("shards cover {} units of a plan of {}, not every unit exactly once".format(owned, planned))
+
+    for m in manifests:
+        if m["missing"]:
+            problems.append("shard {} did not attempt {} units, e.g. {} (rerun it with --resume)".format(m["shard"], len(m["missing"]), m["missing"][0]))
+    return problems
+
+
+##########################################################################
+# FailedUnits
+# Returns the units of the shards whose listing failed with an error
+# answer (e.g. a service not enabled in the tenancy) with its code,
+# they are attempted but have no records
+##########################################################################
+def FailedUnits(manifests):
+    failed = {}
+    for m in manifests:
+        failed.update(m.get("failed", {}))
+    return failed
+
+
+##########################################################################
+# Merge
+# Validates the manifests and concatenates the csv files of the shards
+##########################################################################
+def Merge(manifest_files, outfile, force=False):
+    manifests = []
+    for filename in manifest_files:
+        with open(filename, encoding="utf-8") as manifestfile:
+            manifest = json.load(manifestfile)
+        manifest["csv"] = os.path.join(os.path.dirname(os.path.abspath(filename)), manifest["csv"])
+        manifests.append(manifest)
+    if not manifests:
+        print("No shard manifests to merge")
+        return False
+
+    problems = ValidateShards(manifests)
+    for problem in problems:
+        print("Error: " + problem)
+    if problems and not force:
+        print("Not merged, use --force to merge the partial outputs anyway")
+        return False
+
+    failed = FailedUnits(manifests)
+    if failed:
+        print("Warning: {} units failed with an error and have no records:".format(len(failed)))
+        for unit, code in sorted(failed.items())[:MaxFailedShown]:
+            print("  {} : {}".format(unit, code))
+        if len(failed) > MaxFailedShown:
+            print("  ... and {} more, see the failed units of the manifests".format(len(failed) - MaxFailedShown))
+
+    rows = 0
+    with open(outfile, "w", newline="", encoding="utf-8") as merged:
+        writer = csv.writer(merged)
+        for n, manifest in enumerate(sorted(manifests, key=lambda m: m["shard"])):
+            with open(manifest["csv"], newline="", encoding="utf-8") as part:
+                reader = csv.reader(part)
+                header = next(reader)
+                if n == 0:
+                    writer.writerow(header)
+                for row in reader:
+                    writer.writerow(row)
+                    rows += 1
+    print("Merged {} shards, {} records into {}".format(len(manifests), rows, outfile))
+    return not problems
+
+
+##########################################################################
+# Run
+# Runs the N shards of list.py as local processes and merges them
+##########################################################################
+def Run(count, logfile, listargs):
+    listpy = os.path.join(os.path.dirname(os.path.abspath(__file__)), "list.py")
+    processes = []
+    for index in range(count):
+        shardlog = "{}.shard{}of{}".format(logfile, index, count)
+        args = [sys.executable, listpy, "-f", "-log", shardlog, "--shard", "{}/{}".format(index, count)] + listargs
+        processes.append((shardlog, subprocess.Popen(args, stdout=subprocess.DEVNULL)))
+        print("Started shard {}/{}, log {}".format(index, count, shardlog))
+
+    failed = False
+    for shardlog, process in processes:
+        if process.wait() != 0:
+            print("Shard with log {} exited with {}".format(shardlog, process.returncode))
+            failed = True
+    manifests = [shardlog + ".manifest.json" for shardlog, process in processes if os.path.exists(shardlog + ".manifest.json")]
+    return Merge(manifests, logfile + ".csv") and not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run list.py as shards and merge their outputs")
+    commands = parser.add_subparsers(dest="command")
+    run = commands.add_parser("run", help="Run N local shards of list.py and merge them")
+    run.add_argument("count", type=int, help="Number of shards")
+    run.add_argument("-log", default="log.txt", dest="log_file", help="Log file, the shards write <log>.shard<i>of<N>.* and the merge <log>.csv")
+    run.add_argument("listargs", nargs=argparse.REMAINDER, help="Options passed to list.py, after --")
+    merge = commands.add_parser("merge", help="Merge the outputs of shards")
+    merge.add_argument("manifests", nargs="+", help="Manifest files of the shards (<log>.manifest.json)")
+    merge.add_argument("--outfile", default="merged.csv", help="Merged csv file. Default is merged.csv")
+    merge.add_argument("--force", action="store_true", default=False, help="Merge even if the shards do not cover the plan exactly once")
+    cmd = parser.parse_args()
+
+    if cmd.command == "run":
+        listargs = cmd.listargs[1:] if cmd.listargs and cmd.listargs[0] == "--" else cmd.listargs
+        ok = Run(cmd.count, cmd.log_file, listargs)
+    elif cmd.command == "merge":
+        ok = Merge(cmd.manifests, cmd.outfile, cmd.force)
+    else:
+        parser.print_help()
+        ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import csv
+import datetime
+import types
+from ocimodules import Details
+from ocimodules.Records import CsvSink, FormatRecord
+from ocimodules.parse import parse_text_to_csv
+
+Description = "first line\nsecond line; with=separators\r\nand a \\ backslash"
+
+
+def test_multiline_attribute_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(Details, "Level", 3)
+    full = types.SimpleNamespace(id="ocid1.instance.oc1..a", shape="VM.Standard.E4.Flex", description=Description,
+                                 time_maintenance=datetime.datetime(2024, 1, 2, 3, 4, 5))
+    details = Details.ItemDetails([("shape", "shape")], full, full)
+    assert "\n" not in details and "\r" not in details
+    assert Details.ParseDetails(details) == {"shape": "VM.Standard.E4.Flex", "description": Description, "time_maintenance": "2024-01-02"}
+
+    # The same Details column from the csv written during the listing and from the log re-parsed by log2csv
+    record = {"Service": "instance", "Region": "us-ashburn-1", "Compartment": "/root/a", "display_name": "vm",
+              "id": full.id, "Tenancy": "tenancy", "Details": details}
+    sink = CsvSink(str(tmp_path / "log.txt.csv"))
+    sink.write(record)
+    sink.close()
+    with open(tmp_path / "log.txt", "w", encoding="utf-8") as log:
+        log.write(FormatRecord(record) + "\n")
+    parse_text_to_csv(str(tmp_path / "log.txt"), str(tmp_path / "parsed.csv"), False)
+
+    for filename in ("log.txt.csv", "parsed.csv"):
+        with open(tmp_path / filename, newline="", encoding="utf-8") as csvfile:
+            rows = list(csv.DictReader(csvfile))
+        assert len(rows) == 1
+        assert rows[0]["Details"] == details
+        assert Details.ParseDetails(rows[0]["Details"])["description"] == Description